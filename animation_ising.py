@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 19:01:25 2026
+"""
+
+
+import functions_ising as fi
+import numpy as np
+import shutil
+import subprocess
+
+
+def run_frames(lattice, beta, steps, every = 1, topology = None):
+    """
+    This function evolves the lattice with metropolis_move and gives it every
+    few steps, while the run goes on, so that frames never need to be stored
+
+    Parameters
+    ----------
+    lattice : 2D array
+        lattice spin configuration, updated in place.
+    beta : float
+        1/kT where T is the temperature and the Boltzmann constant k
+        is taken equal to 1.
+    steps : int
+        number of steps of the run.
+    every : int, optional
+        number of steps between frames. The default is 1.
+    topology : LatticeTopology, optional
+        nearest neighbours of the sites. The default is None, that will use the
+        square lattice with PBC.
+
+    Returns
+    -------
+        generator of (step, lattice) frames, starting from step 0; the lattice is
+        the one being evolved, so it must be used before the next frame is taken.
+
+    Raises
+    ------
+        ValueError if the number of steps between frames is < 1.
+
+    """
+
+    if every < 1:
+        raise ValueError('The number of steps between frames must be >= 1, but is {0}\n'.format(every))
+
+    yield 0, lattice
+    for step in range(1, steps + 1):
+        lattice = fi.metropolis_move(lattice, beta, topology)
+        if step%every == 0:
+            yield step, lattice
+
+
+def save_snapshots(frames, path):
+    """
+    This function appends frames to a snapshot store, one at a time; the store
+    is a file of consecutive .npy arrays (the step, then the lattice as 8-bit
+    integers), so that it can grow while a run goes on
+
+    Parameters
+    ----------
+    frames : iterable
+        (step, lattice) frames, e.g. given by run_frames.
+    path : string
+        path of the snapshot store.
+
+    Returns
+    -------
+        number of frames saved.
+
+    """
+
+    numb_frames = 0
+    with open(path, 'ab') as f:
+        for step, lattice in frames:
+            np.save(f, np.array(step))
+            np.save(f, np.asarray(lattice, dtype = np.int8))
+            numb_frames += 1
+
+    return numb_frames
+
+
+def load_snapshots(path):
+    """
+    This function reads the frames of a snapshot store one at a time
+
+    Parameters
+    ----------
+    path : string
+        path of the snapshot store written by save_snapshots.
+
+    Returns
+    -------
+        generator of (step, lattice) frames.
+
+    """
+
+    with open(path, 'rb') as f:
+        while len(f.peek(1)) > 0:
+            step = int(np.load(f))
+            yield step, np.load(f)
+
+
+class _GifStream:
+    """
+    This class writes a GIF one frame at a time with the encoder of Pillow, with
+    a fixed palette given up front, instead of collecting all frames before
+    writing them as Image.save does
+
+    """
+
+    def __init__(self, path, fps, palette):
+        from PIL import GifImagePlugin, Image
+
+        self._plugin = GifImagePlugin
+        self._image = Image
+        self._duration = int(round(1000/fps))
+        self._palette = Image.new('P', (1, 1))
+        self._palette.putpalette(np.ravel(palette).tolist())
+        self._header = False
+        self._file = open(path, 'wb')
+
+    def write(self, rgba):
+        image = self._image.fromarray(np.asarray(rgba)[:, :, :3])
+        frame = image.quantize(palette = self._palette, dither = self._image.Dither.NONE)
+
+        if self._header == False:
+            header, used_palette_colors = self._plugin.getheader(frame.copy(), info = {'loop': 0, 'duration': self._duration})
+            for block in header:
+                self._file.write(block)
+            self._header = True
+
+        for block in self._plugin.getdata(frame, duration = self._duration):
+            self._file.write(block)
+
+    def close(self):
+        self._file.write(b';')
+        self._file.close()
+
+
+def _palette(colors, label, background):
+    """
+    This function gives the colors that can appear in a frame: the spin colors
+    and the background, also under the box of the step number, each one shaded
+    towards the color of the text, as at the antialiased edges of the digits
+
+    Parameters
+    ----------
+    colors : 2D array
+        RGBA colors of spin -1 and +1, as 8-bit integers.
+    label : matplotlib Text
+        step number, drawn in its box over the lattice.
+    background : tuple
+        RGBA color of the figure, with values between 0 and 1.
+
+    Returns
+    -------
+        (numb_colors, 3) array of the RGB colors, as 8-bit integers.
+
+    """
+
+    from matplotlib.colors import to_rgba
+
+    bases = np.vstack([colors[:, :3]/255, [to_rgba(background)[:3]]])
+    box = to_rgba(label.get_bbox_patch().get_facecolor())
+    bases = np.vstack([bases, box[3]*np.array(box[:3]) + (1 - box[3])*bases])
+
+    text = np.array(to_rgba(label.get_color())[:3])
+    shades = np.linspace(0, 1, 16)[:, np.newaxis, np.newaxis]
+    palette = (1 - shades)*bases + shades*text
+
+    return np.unique(np.round(255*palette.reshape(-1, 3)).astype(np.uint8), axis = 0)
+
+
+class _VideoStream:
+    """
+    This class pipes raw RGBA frames to ffmpeg, which encodes them while they
+    are rendered
+
+    """
+
+    def __init__(self, path, fps, size, codec = 'libx264'):
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise FileNotFoundError('ffmpeg is needed to write a video, but was not found; the animation can be saved as a .gif instead\n')
+
+        width, height = size
+        command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgba',
+                   '-s', '{0}x{1}'.format(width, height), '-r', str(fps), '-i', 'pipe:',
+                   '-vcodec', codec, '-pix_fmt', 'yuv420p', path]
+        self._process = subprocess.Popen(command, stdin = subprocess.PIPE)
+
+    def write(self, rgba):
+        self._process.stdin.write(rgba)
+
+    def close(self):
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise IOError('ffmpeg could not write the video, exit status {0}\n'.format(self._process.returncode))
+
+
+def render_animation(frames, save_path = 'evolution.gif', fps = 20, scale = 1, title = True, codec = 'libx264'):
+    """
+    This function renders frames of the lattice evolution to a GIF or a video,
+    as they arrive: the figure is drawn once, and for each frame the saved
+    background is restored, only the image data (colored by a lookup) and the
+    step number are drawn over it (blitting), and the pixels are written to the
+    file; matplotlib is only imported here, and no frame is kept after it is written
+
+    Parameters
+    ----------
+    frames : iterable
+        (step, lattice) frames, e.g. given by run_frames or load_snapshots.
+    save_path : string, optional
+        path of the animation; a .gif is written with Pillow, any other extension
+        (e.g. .mp4) with ffmpeg. The default is 'evolution.gif'.
+    fps : int, optional
+        frames per second. The default is 20.
+    scale : int, optional
+        pixels per lattice site along each direction. The default is 1.
+    title : bool, optional
+        if True, the step number is shown on each frame. The default is True.
+    codec : string, optional
+        video codec used by ffmpeg. The default is 'libx264'.
+
+    Returns
+    -------
+        number of frames written.
+
+    Raises
+    ------
+        ValueError if there are no frames, or if fps or scale are < 1.
+
+    """
+
+    if fps < 1 or scale < 1:
+        raise ValueError('Frames per second and pixels per site must be >= 1, but are {0} and {1}\n'.format(fps, scale))
+
+    frames = iter(frames)
+    try:
+        step, lattice = next(frames)
+    except StopIteration:
+        raise ValueError('There are no frames to render\n')
+
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    #Even sizes in pixels, as required by most video codecs
+    length, width = np.shape(lattice)
+    size = (2*((width*scale + 1)//2), 2*((length*scale + 1)//2))
+
+    dpi = 100
+    figure = Figure(figsize = (size[0]/dpi, size[1]/dpi), dpi = dpi)
+    canvas = FigureCanvasAgg(figure)
+
+    #Colors of spin -1 and +1, so that frames are colored by a lookup
+    import matplotlib
+    colors = (255*matplotlib.colormaps['RdBu']([0.0, 1.0])).astype(np.uint8)
+
+    #The step number is the only artist drawn again at every frame
+    label = figure.text(0.01, 0.99, '', va = 'top', fontsize = max(6, size[1]//40),
+                        bbox = {'facecolor': 'white', 'alpha': 0.7, 'linewidth': 0}, animated = True)
+
+    canvas.draw()
+    background = canvas.copy_from_bbox(figure.bbox)
+
+    #Pixels of the canvas, where the sites are written directly, each one repeated scale times
+    pixels = np.asarray(canvas.buffer_rgba())[:length*scale, :width*scale]
+
+    if save_path.lower().endswith('.gif'):
+        stream = _GifStream(save_path, fps, _palette(colors, label, figure.get_facecolor()))
+    else:
+        stream = _VideoStream(save_path, fps, size, codec)
+
+    numb_frames = 0
+    try:
+        while True:
+            canvas.restore_region(background)
+            sites = colors[(np.asarray(lattice) > 0).astype(np.uint8)]
+            pixels[...] = np.repeat(np.repeat(sites, scale, axis = 0), scale, axis = 1)
+            if title == True:
+                label.set_text('Time = {0}'.format(step))
+                figure.draw_artist(label)
+
+            stream.write(canvas.buffer_rgba())
+            numb_frames += 1
+
+            try:
+                step, lattice = next(frames)
+            except StopIteration:
+                break
+    finally:
+        stream.close()
+
+    return numb_frames
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 18:37:03 2026
+"""
+
+
+import hashlib
+import json
+import logging
+import numbers
+import os
+
+
+def _normalize(parameters):
+    """
+    This function converts the parameters to plain python types, so that numpy
+    scalars and python numbers with the same value are written in the same way
+
+    Parameters
+    ----------
+    parameters : dict
+        parameters of the point.
+
+    Returns
+    -------
+        dictionary of the parameters with plain python types.
+
+    """
+
+    normalized = {}
+    for key, value in parameters.items():
+        if isinstance(value, numbers.Integral) and not isinstance(value, bool):
+            value = int(value)
+        elif isinstance(value, numbers.Real):
+            value = float(value)
+        normalized[key] = value
+
+    return normalized
+
+
+def point_key(parameters):
+    """
+    This function calculates the content address of a temperature point, i.e. the
+    hash of all the parameters its observables depend on
+
+    Parameters
+    ----------
+    parameters : dict
+        parameters of the point, e.g. N, M, T, seed, spin_up_pol, eq_steps,
+        mc_steps and engine version.
+
+    Returns
+    -------
+        hexadecimal SHA-256 hash of the parameters.
+
+    """
+
+    #Sorted keys and floats written exactly, so that equal parameters give equal keys
+    text = json.dumps(_normalize(parameters), sort_keys = True)
+
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def load_point(parameters, cache_dir, required = ()):
+    """
+    This function loads the observables of a temperature point from the cache,
+    marking it as recently used
+
+    Parameters
+    ----------
+    parameters : dict
+        parameters of the point.
+    cache_dir : string
+        path of the cache directory.
+    required : 1D-like array, optional
+        observables that the point must have to be loaded, e.g. 'ene_steps'. The default is ().
+
+    Returns
+    -------
+        the cached dictionary of observables, or None if the point is not in the cache.
+
+    """
+
+    path = os.path.join(cache_dir, point_key(parameters) + '.json')
+
+    try:
+        with open(path) as f:
+            point = json.load(f)['point']
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+    if any(name not in point for name in required):
+        return None
+
+    #The modification time is the last access, for the LRU eviction
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+    logging.debug('Loaded cached point {0}\n'.format(parameters))
+
+    return point
+
+
+def save_point(parameters, point, cache_dir, max_bytes = None):
+    """
+    This function saves the observables of a temperature point in the cache, and
+    evicts the least recently used points if the cache is too big
+
+    Parameters
+    ----------
+    parameters : dict
+        parameters of the point.
+    point : dict
+        observables of the point.
+    cache_dir : string
+        path of the cache directory.
+    max_bytes : int, optional
+        maximum size of the cache. The default is None, that will never evict.
+
+    Returns
+    -------
+        None.
+
+    Raises
+    ------
+        IOError if the file cannot be created.
+
+    """
+
+    os.makedirs(cache_dir, exist_ok = True)
+    key = point_key(parameters)
+    path = os.path.join(cache_dir, key + '.json')
+
+    #Written to a temporary file first, so that other processes never read half a point
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({'parameters': _normalize(parameters), 'point': point}, f)
+        os.replace(tmp_path, path)
+    except IOError:
+        logging.error('It may be that you do not have the permission to create or open the file; try to change the cache directory\n')
+        raise IOError('It may be that you do not have the permission to create or open the file; try to change the cache directory\n')
+
+    if max_bytes is not None:
+        evict(cache_dir, max_bytes)
+
+
+def _entries(cache_dir):
+    """
+    This function lists the points in the cache
+
+    Parameters
+    ----------
+    cache_dir : string
+        path of the cache directory.
+
+    Returns
+    -------
+        list of (last access time, size, path) of the points.
+
+    """
+
+    entries = []
+    if not os.path.isdir(cache_dir):
+        return entries
+
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.json'):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    return entries
+
+
+def evict(cache_dir, max_bytes):
+    """
+    This function removes the least recently used points until the cache is not
+    bigger than the given size
+
+    Parameters
+    ----------
+    cache_dir : string
+        path of the cache directory.
+    max_bytes : int
+        maximum size of the cache.
+
+    Returns
+    -------
+        number of removed points.
+
+    """
+
+    entries = sorted(_entries(cache_dir))
+    total = sum(size for access, size, path in entries)
+    removed = 0
+
+    for access, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+
+    if removed > 0:
+        logging.info('Evicted {0} points from the cache\n'.format(removed))
+
+    return removed
+
+
+def invalidate_cache(cache_dir, **match):
+    """
+    This function removes the points in the cache, either all of them or only
+    the ones with the given parameters
+
+    Parameters
+    ----------
+    cache_dir : string
+        path of the cache directory.
+    **match : optional
+        parameters that the points to be removed must have, e.g. N = 32;
+        if none is given, the whole cache is removed.
+
+    Returns
+    -------
+        number of removed points.
+
+    """
+
+    removed = 0
+
+    for access, size, path in _entries(cache_dir):
+        if len(match) > 0:
+            try:
+                with open(path) as f:
+                    parameters = json.load(f)['parameters']
+            except (FileNotFoundError, ValueError, KeyError):
+                continue
+            if any(parameters.get(key) != value for key, value in match.items()):
+                continue
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+
+    return removed
+
+
+def cache_info(cache_dir):
+    """
+    This function describes the content of the cache
+
+    Parameters
+    ----------
+    cache_dir : string
+        path of the cache directory.
+
+    Returns
+    -------
+        number of points and total size in bytes.
+
+    """
+
+    entries = _entries(cache_dir)
+
+    return len(entries), sum(size for access, size, path in entries)
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 18:35:28 2026
+"""
+
+
+import simulation as sim
+import transfer_matrix as tm
+import numpy as np
+import logging
+import multiprocessing
+
+
+#Columns of the campaign store; Monte Carlo engines give the mean magnetization and the exact
+#engine the root mean square one, the other column being nan
+STORE_COLUMNS = ('N', 'M', 'T', 'seed', 'energy', 'magnetization', 'magnetization_rms')
+
+
+def _read_list(configuration, section, option, convert):
+    """
+    This function reads a comma separated list from a configuration file
+
+    Parameters
+    ----------
+    configuration : configparser
+        configuration to be read.
+    section : string
+        section of the option.
+    option : string
+        option containing the list.
+    convert : callable
+        function converting each element, e.g. int or float.
+
+    Returns
+    -------
+        list of converted elements.
+
+    """
+
+    return [convert(value) for value in configuration.get(section, option).split(',') if value.strip() != '']
+
+
+def read_campaign(configuration):
+    """
+    This function reads the parameters of a campaign from a configuration file
+    with a CAMPAIGN section, as in CAMPAIGN.ini
+
+    Parameters
+    ----------
+    configuration : configparser
+        configuration with a CAMPAIGN section.
+
+    Returns
+    -------
+        dictionary with the parameters of expand_tasks and run_campaign, and the 'store_path'.
+
+    Raises
+    ------
+        ValueError if the temperature ranges are neither one nor one per lattice size,
+        or if a lattice size is too large for the exact engine.
+
+    """
+
+    sizes = _read_list(configuration, 'CAMPAIGN', 'sizes', int)
+    T_init = _read_list(configuration, 'CAMPAIGN', 'T_init', float)
+    T_final = _read_list(configuration, 'CAMPAIGN', 'T_final', float)
+    numb_T = _read_list(configuration, 'CAMPAIGN', 'numb_T', int)
+
+    #The same range for all sizes, or a range for each size
+    for values in (T_init, T_final, numb_T):
+        if len(values) != 1 and len(values) != len(sizes):
+            raise ValueError('Temperature ranges must be given once or once per lattice size ({0}), but got {1}\n'.format(len(sizes), len(values)))
+        if len(values) == 1:
+            values *= len(sizes)
+
+    T_ranges = [np.linspace(T_init[i], T_final[i], numb_T[i]) for i in range(len(sizes))]
+
+    spin_up_pol = configuration.get('CAMPAIGN', 'spin_up_pol')
+    spin_up_pol = None if spin_up_pol == 'None' else float(spin_up_pol)
+
+    cache_dir, cache_size = sim.read_cache_configuration(configuration)
+
+    #Sizes too large for the exact engine are rejected before any task runs
+    engine = configuration.get('CAMPAIGN', 'engine', fallback = 'metropolis')
+    if engine == 'exact':
+        for size in sizes:
+            tm.check_width(size, size)
+
+    return {'sizes': sizes,
+            'T_ranges': T_ranges,
+            'seeds': _read_list(configuration, 'CAMPAIGN', 'seeds', int),
+            'spin_up_pol': spin_up_pol,
+            'eq_steps': configuration.getint('CAMPAIGN', 'eq_steps'),
+            'mc_steps': configuration.getint('CAMPAIGN', 'mc_steps'),
+            'processes': configuration.getint('CAMPAIGN', 'processes'),
+            'store_path': configuration.get('CAMPAIGN', 'store_path'),
+            'cache_dir': cache_dir,
+            'cache_size': cache_size,
+            'engine': engine}
+
+
+def expand_tasks(sizes, T_ranges, seeds):
+    """
+    This function expands a campaign into (N, M, T, seed) tasks of square
+    lattices, ordered with the largest lattices first
+
+    Parameters
+    ----------
+    sizes : 1D-like array
+        side lengths of the square lattices.
+    T_ranges : 1D-like array
+        temperature points, either a single array for all sizes or one array per size.
+    seeds : 1D-like array
+        seeds to be run for each size and temperature.
+
+    Returns
+    -------
+        list of (N, M, T, seed) tuples, with the largest lattices first.
+
+    Raises
+    ------
+        ValueError if the temperature ranges are neither one nor one per lattice size.
+
+    """
+
+    #A single array of temperatures is used for every size
+    if np.ndim(T_ranges[0]) == 0:
+        T_ranges = [T_ranges]*len(sizes)
+
+    if len(T_ranges) != len(sizes):
+        raise ValueError('Temperature ranges must be given once or once per lattice size ({0}), but got {1}\n'.format(len(sizes), len(T_ranges)))
+
+    tasks = [(L, L, float(T), seed) for L, T_range in zip(sizes, T_ranges) for T in T_range for seed in seeds]
+
+    #Largest first, so that big lattices do not become the tail of the campaign
+    tasks.sort(key = lambda task: task[0]*task[1], reverse = True)
+
+    return tasks
+
+
+def _run_task(arguments):
+    """
+    This function runs a task in a worker process
+
+    Parameters
+    ----------
+    arguments : tuple
+        the (N, M, T, seed) task followed by spin_up_pol, eq_steps, mc_steps, cache_dir, cache_size and engine.
+
+    Returns
+    -------
+        the task and the dictionary of run_temperature_point.
+
+    """
+
+    (N, M, T, seed), spin_up_pol, eq_steps, mc_steps, cache_dir, cache_size, engine = arguments
+    point = sim.run_temperature_point(N, M, T, seed, spin_up_pol, eq_steps, mc_steps, cache_dir = cache_dir, cache_size = cache_size, engine = engine)
+
+    return (N, M, T, seed), point
+
+
+def run_campaign(tasks, spin_up_pol = None, eq_steps = 1000, mc_steps = 1000, processes = None, progress = False, cache_dir = None, cache_size = None, engine = 'metropolis'):
+    """
+    This function runs the tasks of a campaign on a process pool, in the given
+    order, and collects their results
+
+    Parameters
+    ----------
+    tasks : 1D-like array
+        (N, M, T, seed) tasks, as given by expand_tasks.
+    spin_up_pol : float, optional
+        mean spin up polarization. The default is None, that will generate a random lattice.
+    eq_steps : int, optional
+        steps waited before starting the acquisition of observables. The default is 1000.
+    mc_steps : int, optional
+        steps used to calculate thermodinamical averages. The default is 1000.
+    processes : int, optional
+        number of worker processes. The default is None, that will use all the cores.
+    progress : bool, optional
+        if True, a progress bar is shown. The default is False.
+    cache_dir : string, optional
+        directory of the cache of temperature points, shared by the workers. The default is None, that will not use the cache.
+    cache_size : int, optional
+        maximum size of the cache in bytes. The default is None, that will never evict points.
+    engine : string, optional
+        algorithm updating the lattice, one of simulation.ENGINES. The default is 'metropolis'.
+
+    Returns
+    -------
+        array with the STORE_COLUMNS as columns, one row per task, sorted by N, M, seed and T.
+
+    Raises
+    ------
+        ValueError if a lattice is too large for the exact engine, or if the engine
+        is 'shared', whose workers cannot be started by the processes of the pool.
+
+    """
+
+    if engine == 'shared':
+        raise ValueError('The shared engine runs a lattice on many processes, which cannot be started by the campaign pool; the tasks can be run by the coordinator instead\n')
+
+    if engine == 'exact':
+        for N, M, T, seed in tasks:
+            tm.check_width(int(N), int(M))
+
+    arguments = [(task, spin_up_pol, eq_steps, mc_steps, cache_dir, cache_size, engine) for task in tasks]
+
+    with multiprocessing.Pool(processes) as pool:
+        #Tasks are handed out one at a time, so the largest-first order is kept
+        results = pool.imap_unordered(_run_task, arguments, chunksize = 1)
+
+        if progress == True:
+            from tqdm import tqdm
+            results = tqdm(results, total = len(arguments), desc = 'Campaign tasks', position = 0)
+
+        store = collect_store(results)
+
+    return store
+
+
+def collect_store(results):
+    """
+    This function collects the results of the tasks of a campaign in a single array
+
+    Parameters
+    ----------
+    results : iterable
+        ((N, M, T, seed), point) of each task, where point is the dictionary of
+        run_temperature_point.
+
+    Returns
+    -------
+        array with the STORE_COLUMNS as columns, one row per task, sorted by N, M, seed and T.
+
+    """
+
+    rows = []
+
+    for (N, M, T, seed), point in results:
+        rows.append((N, M, T, seed, point['energy'], point.get('magnetization', np.nan), point.get('magnetization_rms', np.nan)))
+        logging.debug('Task N = {0}, M = {1}, T = {2}, seed = {3} completed\n'.format(N, M, T, seed))
+
+    store = np.array(rows, dtype = float).reshape(-1, len(STORE_COLUMNS))
+
+    return store[np.lexsort((store[:, 2], store[:, 3], store[:, 1], store[:, 0]))]
+
+
+def save_campaign(store, path = 'campaign.txt'):
+    """
+    This function saves the results of a campaign in a single file
+
+    Parameters
+    ----------
+    store : 2D-like array
+        results of run_campaign.
+    path : string, optional
+        path for the save file. The default is 'campaign.txt'.
+
+    Returns
+    -------
+        None.
+
+    Raises
+    ------
+        IOError if the file cannot be created.
+
+    """
+
+    try:
+        np.savetxt(path, store, header = ' '.join(STORE_COLUMNS))
+    except IOError:
+        logging.error('It may be that you do not have the permission to create or open the file; if you want to save the data, try to create an empty file with the name of the save path\n')
+        raise IOError('It may be that you do not have the permission to create or open the file; if you want to save the data, try to create an empty file with the name of the save path\n')
+
+
+def load_campaign(path = 'campaign.txt'):
+    """
+    This function loads the results of a campaign saved by save_campaign
+
+    Parameters
+    ----------
+    path : string, optional
+        path of the saved file. The default is 'campaign.txt'.
+
+    Returns
+    -------
+        array with the STORE_COLUMNS as columns.
+
+    """
+
+    return np.loadtxt(path, ndmin = 2)
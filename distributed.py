@@ -0,0 +1,551 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 18:42:02 2026
+"""
+
+
+import simulation as sim
+import campaign as ca
+import transfer_matrix as tm
+import collections
+import logging
+import multiprocessing
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+
+class TaskBoard:
+    """
+    This class holds the tasks of a distributed campaign in the coordinator:
+    workers take pending tasks, which are leased to them and renewed by their
+    heartbeats while they run, and give back either their results or their
+    failures; failed tasks, as well as tasks whose lease expired because the
+    heartbeats stopped (e.g. because the worker or its host died), are put back
+    in the queue. Each lease has its own token, so that a worker whose lease
+    expired cannot renew or give up the lease of the worker now running its task
+
+    Parameters
+    ----------
+    tasks : 1D-like array
+        dictionaries of keyword arguments of run_temperature_point, one per task.
+    max_retries : int, optional
+        number of failures after which a task is given up. The default is 3.
+    lease_timeout : float, optional
+        seconds without heartbeats after which a task that was not given back is put
+        back in the queue. The default is 60; None waits forever.
+    clock : callable, optional
+        function giving the time in seconds, used for the leases. The default is time.monotonic.
+
+    """
+
+    def __init__(self, tasks, max_retries = 3, lease_timeout = 60, clock = time.monotonic):
+        self._lock = threading.Lock()
+        self._tasks = list(tasks)
+        self._pending = collections.deque(range(len(self._tasks)))
+        self._leases = {}
+        self._next_lease = 0
+        self._clock = clock
+        self._results = {}
+        self._failures = collections.Counter()
+        self._errors = {}
+        self.max_retries = max_retries
+        self.lease_timeout = lease_timeout
+
+    def _requeue_expired(self):
+        """
+        This function puts back in the queue the tasks whose lease expired; to
+        be called holding the lock
+
+        """
+
+        now = self._clock()
+        for task_id, (lease, deadline) in list(self._leases.items()):
+            if deadline is not None and now >= deadline:
+                del self._leases[task_id]
+                self._pending.append(task_id)
+                logging.warning('Task {0} was not given back in time and is put back in the queue\n'.format(task_id))
+
+    def _deadline(self):
+        """
+        This function gives the time when a lease taken or renewed now expires;
+        to be called holding the lock
+
+        """
+
+        return None if self.lease_timeout is None else self._clock() + self.lease_timeout
+
+    def _holds(self, task_id, lease):
+        """
+        This function tells if a lease is the current one of a task; to be
+        called holding the lock
+
+        """
+
+        return task_id in self._leases and self._leases[task_id][0] == lease
+
+    def get_task(self):
+        """
+        This function gives a pending task to a worker
+
+        Returns
+        -------
+            tuple (status, task_id, task, lease), where status is 'run' if the task
+            is to be run, 'wait' if no task is pending but some are still running,
+            and 'done' if all tasks are finished; lease is the token to be given
+            back with the heartbeats and the result or failure of the task.
+
+        """
+
+        with self._lock:
+            self._requeue_expired()
+
+            #Skip the tasks that were finished by a worker whose lease had expired
+            while len(self._pending) > 0:
+                task_id = self._pending.popleft()
+                if task_id not in self._results and task_id not in self._errors:
+                    self._next_lease += 1
+                    self._leases[task_id] = (self._next_lease, self._deadline())
+                    return 'run', task_id, self._tasks[task_id], self._next_lease
+
+            if self._finished():
+                return 'done', None, None, None
+
+            return 'wait', None, None, None
+
+    def heartbeat(self, task_id, lease):
+        """
+        This function renews the lease of a running task
+
+        Parameters
+        ----------
+        task_id : int
+            index of the task.
+        lease : int
+            token of the lease, given by get_task.
+
+        Returns
+        -------
+            True if the lease is still held, False if it had already expired (its
+            result is still accepted, if it is the first one).
+
+        """
+
+        with self._lock:
+            if not self._holds(task_id, lease):
+                return False
+
+            self._leases[task_id] = (lease, self._deadline())
+            return True
+
+    def put_result(self, task_id, lease, point):
+        """
+        This function stores the result of a task; only the first result of a
+        task is kept, also if its lease had expired
+
+        Parameters
+        ----------
+        task_id : int
+            index of the task.
+        lease : int
+            token of the lease, given by get_task.
+        point : dict
+            result of the task.
+
+        Returns
+        -------
+            None.
+
+        """
+
+        with self._lock:
+            if self._holds(task_id, lease):
+                del self._leases[task_id]
+            if task_id not in self._results:
+                self._results[task_id] = point
+                self._errors.pop(task_id, None)
+
+    def put_failure(self, task_id, lease, message):
+        """
+        This function records the failure of a task, and puts it back in the
+        queue unless it failed max_retries times; failures of expired leases are
+        ignored, since the task was already put back in the queue
+
+        Parameters
+        ----------
+        task_id : int
+            index of the task.
+        lease : int
+            token of the lease, given by get_task.
+        message : string
+            description of the failure.
+
+        Returns
+        -------
+            None.
+
+        """
+
+        with self._lock:
+            if not self._holds(task_id, lease):
+                logging.warning('Task {0} failed after its lease expired, the failure is ignored: {1}\n'.format(task_id, message))
+                return
+
+            del self._leases[task_id]
+            if task_id in self._results:
+                return
+
+            self._failures[task_id] += 1
+            logging.warning('Task {0} failed ({1} of {2} attempts): {3}\n'.format(task_id, self._failures[task_id], self.max_retries, message))
+
+            if self._failures[task_id] < self.max_retries:
+                self._pending.append(task_id)
+            else:
+                self._errors[task_id] = message
+
+    def _finished(self):
+        """
+        This function tells if all tasks either have a result or were given up;
+        to be called holding the lock
+
+        """
+
+        return len(self._results) + len(self._errors) == len(self._tasks)
+
+    def finished(self):
+        """
+        This function tells if all tasks either have a result or were given up
+
+        Returns
+        -------
+            True if the campaign is finished.
+
+        """
+
+        with self._lock:
+            self._requeue_expired()
+            return self._finished()
+
+    def progress(self):
+        """
+        This function describes the state of the campaign
+
+        Returns
+        -------
+            number of finished tasks and total number of tasks.
+
+        """
+
+        with self._lock:
+            return len(self._results) + len(self._errors), len(self._tasks)
+
+    def results(self):
+        """
+        This function gives the results and the errors of the finished tasks
+
+        Returns
+        -------
+            list of (task, point) of the tasks with a result, and list of (task, message)
+            of the tasks that were given up.
+
+        """
+
+        with self._lock:
+            results = [(self._tasks[task_id], point) for task_id, point in sorted(self._results.items())]
+            errors = [(self._tasks[task_id], message) for task_id, message in sorted(self._errors.items())]
+            return results, errors
+
+
+#The board lives in the process of the manager server
+_board = None
+
+
+def _initialize_board(tasks, max_retries, lease_timeout):
+    """
+    This function creates the board in the process of the manager server
+
+    """
+
+    global _board
+    _board = TaskBoard(tasks, max_retries, lease_timeout)
+
+
+def _get_board():
+    """
+    This function gives the board of the manager server to the connections
+
+    """
+
+    return _board
+
+
+class CoordinatorManager(BaseManager):
+    """
+    This class is the manager through which workers, on this or on other hosts,
+    reach the board of the coordinator
+
+    """
+
+
+CoordinatorManager.register('get_board', callable = _get_board)
+
+
+def parse_address(address):
+    """
+    This function converts an address written as 'host:port'
+
+    Parameters
+    ----------
+    address : string
+        address of the coordinator, e.g. 'localhost:50000'.
+
+    Returns
+    -------
+        tuple (host, port).
+
+    Raises
+    ------
+        ValueError if the address has no port.
+
+    """
+
+    host, separator, port = address.rpartition(':')
+    if separator == '':
+        raise ValueError('The address must be written as host:port, but is {0}\n'.format(address))
+
+    return host, int(port)
+
+
+def start_coordinator(tasks, address = ('', 50000), authkey = b'ising', max_retries = 3, lease_timeout = 60):
+    """
+    This function starts the server of the coordinator in a separate process
+
+    Parameters
+    ----------
+    tasks : 1D-like array
+        dictionaries of keyword arguments of run_temperature_point, one per task.
+    address : tuple, optional
+        (host, port) where workers connect; port 0 chooses a free port. The default is ('', 50000), i.e. all interfaces.
+    authkey : bytes, optional
+        key shared with the workers. The default is b'ising'.
+    max_retries : int, optional
+        number of failures after which a task is given up. The default is 3.
+    lease_timeout : float, optional
+        seconds without heartbeats after which a task that was not given back is put
+        back in the queue. The default is 60; None waits forever.
+
+    Returns
+    -------
+        the started manager, whose address is manager.address, and the proxy of its board.
+
+    """
+
+    manager = CoordinatorManager(address, authkey)
+    manager.start(_initialize_board, (list(tasks), max_retries, lease_timeout))
+
+    return manager, manager.get_board()
+
+
+def _send_heartbeats(board, task_id, lease, heartbeat_interval, stop):
+    """
+    This function runs in a thread of the worker, renewing the lease of its task
+    until it is stopped
+
+    Parameters
+    ----------
+    board : proxy of TaskBoard
+        board of the coordinator.
+    task_id : int
+        index of the running task.
+    lease : int
+        token of the lease of the task.
+    heartbeat_interval : float
+        seconds between heartbeats.
+    stop : threading.Event
+        set when the task is finished.
+
+    Returns
+    -------
+        None.
+
+    """
+
+    while not stop.wait(heartbeat_interval):
+        try:
+            board.heartbeat(task_id, lease)
+        except (EOFError, ConnectionError):
+            break
+
+
+def run_worker(address, authkey = b'ising', function = sim.run_temperature_point, poll_interval = 0.5, connect_timeout = 30, heartbeat_interval = 10, **options):
+    """
+    This function runs a worker: it takes tasks from the coordinator, runs
+    them, renewing their lease with heartbeats, and gives back their results,
+    until the campaign is finished or the coordinator cannot be reached
+
+    Parameters
+    ----------
+    address : tuple
+        (host, port) of the coordinator.
+    authkey : bytes, optional
+        key shared with the coordinator. The default is b'ising'.
+    function : callable, optional
+        function called with the keyword arguments of each task. The default is run_temperature_point.
+    poll_interval : float, optional
+        seconds waited when no task is pending. The default is 0.5.
+    connect_timeout : float, optional
+        seconds waited for the coordinator to start. The default is 30.
+    heartbeat_interval : float, optional
+        seconds between the heartbeats of a running task, to be well below the lease
+        timeout of the coordinator. The default is 10.
+    **options : optional
+        keyword arguments added to each task, e.g. the local cache_dir of the worker.
+
+    Returns
+    -------
+        number of tasks run successfully.
+
+    """
+
+    #The coordinator may not be up yet
+    start = time.monotonic()
+    while True:
+        manager = CoordinatorManager(address, authkey)
+        try:
+            manager.connect()
+            break
+        except ConnectionError:
+            if time.monotonic() - start > connect_timeout:
+                raise
+            time.sleep(poll_interval)
+
+    board = manager.get_board()
+    completed = 0
+
+    while True:
+        try:
+            status, task_id, task, lease = board.get_task()
+        except (EOFError, ConnectionError):
+            logging.info('The coordinator cannot be reached any more, the worker stops\n')
+            break
+
+        if status == 'done':
+            break
+        if status == 'wait':
+            time.sleep(poll_interval)
+            continue
+
+        #Heartbeats keep the lease while the task runs, however long it takes
+        stop = threading.Event()
+        heartbeats = threading.Thread(target = _send_heartbeats, args = (board, task_id, lease, heartbeat_interval, stop), daemon = True)
+        heartbeats.start()
+
+        try:
+            try:
+                point = function(**task, **options)
+            except Exception as error:
+                board.put_failure(task_id, lease, repr(error))
+                continue
+            finally:
+                stop.set()
+                heartbeats.join()
+
+            board.put_result(task_id, lease, point)
+        except (EOFError, ConnectionError):
+            logging.info('The coordinator cannot be reached any more, the worker stops\n')
+            break
+
+        completed += 1
+
+    return completed
+
+
+def _heartbeat_interval(lease_timeout):
+    """
+    This function chooses the interval between heartbeats of the local workers,
+    so that a few of them are sent within each lease
+
+    """
+
+    return 10 if lease_timeout is None else min(10, lease_timeout/4)
+
+
+def run_distributed(tasks, spin_up_pol = None, eq_steps = 1000, mc_steps = 1000, address = ('', 50000), authkey = b'ising', local_workers = 0, max_retries = 3, lease_timeout = 60, poll_interval = 0.5, engine = 'metropolis', cache_dir = None, cache_size = None):
+    """
+    This function runs the (N, M, T, seed) tasks of a campaign through a
+    coordinator, to which workers connect from this or other hosts with
+    run_worker, and collects their results
+
+    Parameters
+    ----------
+    tasks : 1D-like array
+        (N, M, T, seed) tasks, as given by campaign.expand_tasks.
+    spin_up_pol : float, optional
+        mean spin up polarization. The default is None, that will generate a random lattice.
+    eq_steps : int, optional
+        steps waited before starting the acquisition of observables. The default is 1000.
+    mc_steps : int, optional
+        steps used to calculate thermodinamical averages. The default is 1000.
+    address : tuple, optional
+        (host, port) where workers connect. The default is ('', 50000), i.e. all interfaces.
+    authkey : bytes, optional
+        key shared with the workers. The default is b'ising'.
+    local_workers : int, optional
+        number of workers started as processes of this host. The default is 0.
+    max_retries : int, optional
+        number of failures after which a task is given up. The default is 3.
+    lease_timeout : float, optional
+        seconds without heartbeats after which a task that was not given back is put
+        back in the queue. The default is 60; None waits forever.
+    poll_interval : float, optional
+        seconds between checks of the campaign progress. The default is 0.5.
+    engine : string, optional
+        algorithm updating the lattice, one of simulation.ENGINES. The default is 'metropolis'.
+    cache_dir : string, optional
+        directory of the cache of temperature points of the local workers. The default is None, that will not use the cache.
+    cache_size : int, optional
+        maximum size of the cache in bytes. The default is None, that will never evict points.
+
+    Returns
+    -------
+        array with the campaign.STORE_COLUMNS as columns, one row per task with a result.
+
+    Raises
+    ------
+        ValueError if a lattice is too large for the exact engine.
+
+    """
+
+    #Lattices too large for the exact engine are rejected before the coordinator starts
+    if engine == 'exact':
+        for N, M, T, seed in tasks:
+            tm.check_width(int(N), int(M))
+
+    task_arguments = [{'N': N, 'M': M, 'T': T, 'seed': seed, 'spin_up_pol': spin_up_pol, 'eq_steps': eq_steps, 'mc_steps': mc_steps, 'engine': engine} for N, M, T, seed in tasks]
+    manager, board = start_coordinator(task_arguments, address, authkey, max_retries, lease_timeout)
+    logging.info('Coordinator listening at {0}\n'.format(manager.address))
+
+    #Local workers share the cache of the coordinator host
+    options = {'poll_interval': poll_interval, 'heartbeat_interval': _heartbeat_interval(lease_timeout)}
+    if cache_dir is not None:
+        options.update(cache_dir = cache_dir, cache_size = cache_size)
+    workers = [multiprocessing.Process(target = run_worker, args = (manager.address, authkey), kwargs = options) for i in range(local_workers)]
+    for worker in workers:
+        worker.start()
+
+    try:
+        while not board.finished():
+            time.sleep(poll_interval)
+        results, errors = board.results()
+    finally:
+        #Local workers stop by themselves once the campaign is finished
+        for worker in workers:
+            worker.join(10*poll_interval)
+            if worker.is_alive():
+                worker.terminate()
+        manager.shutdown()
+
+    for task, message in errors:
+        logging.error('Task N = {0}, M = {1}, T = {2}, seed = {3} was given up: {4}\n'.format(task['N'], task['M'], task['T'], task['seed'], message))
+
+    return ca.collect_store(((task['N'], task['M'], task['T'], task['seed']), point) for task, point in results)
@@ -6,6 +6,7 @@ Created on Tue Dec 14 14:46:41 2021
 """
 
 
+import lattice_topology as lt
 import numpy as np
 import logging 
 import configparser
@@ -62,7 +63,7 @@ def initialize_state(N, M, spin_up_pol = None, seed = 42):
     return initial_state
 
 
-def metropolis_move(lattice, beta):
+def metropolis_move(lattice, beta, topology = None):
     """
     This functions uses the Metropolis algorithm to update the lattice spins
 
@@ -73,6 +74,9 @@ def metropolis_move(lattice, beta):
     beta : float
         1/kT where T is the temperature and the Boltzmann constant k 
         is taken equal to 1.
+    topology : LatticeTopology, optional
+        nearest neighbours of the sites. The default is None, that will use the 
+        square lattice with PBC.
 
     Returns
     -------
@@ -84,15 +88,28 @@ def metropolis_move(lattice, beta):
     length = len(lattice)
     width = len(lattice[0])
     
+    if topology is None:
+        topology = lt.get_topology(length, width)
+    neighbours = topology.neighbour_lists
+    
+    #Acceptance probabilities of the positive energy changes, the only ones that can be rejected
+    acceptance = {energy: np.exp(-energy*beta) for energy in range(0, 2*topology.coordination + 1, 2)}
+    
+    #Spins are updated as a list, indexed like the neighbours, and copied back at the end
+    spins = np.ravel(lattice).tolist()
+    
     for i in range(length):
         for j in range(width):
             #Take a random lattice point 
             x = np.random.randint(0, length)
             y = np.random.randint(0, width)
-            site_spin = lattice[x, y]
+            site = x*width + y
+            site_spin = spins[site]
             
-            #Nearest neighbours total spin, considering PBC
-            neighbour_spin = lattice[(x+1)%length, y] + lattice[x, (y+1)%width] + lattice[(x-1)%length, y] + lattice[x, (y-1)%width]
+            #Nearest neighbours total spin
+            neighbour_spin = 0
+            for neighbour in neighbours[site]:
+                neighbour_spin += spins[neighbour]
             
             #Energy change due to spin flip
             energy_change = 2*site_spin*neighbour_spin
@@ -100,43 +117,141 @@ def metropolis_move(lattice, beta):
             #If the energy change is negative, accept the move and flip the spin, otherwise accept the move with probability exp(-cost*beta), and flip the spin. 
             if energy_change < 0:
                 site_spin *= -1
-            elif np.random.random() < np.exp(-energy_change*beta):
+            elif np.random.random() < acceptance[energy_change]:
                 site_spin *= -1
             
             #Update lattice with new spin state
-            lattice[x, y] = site_spin
+            spins[site] = site_spin
+    
+    lattice[...] = np.reshape(spins, lattice.shape)
             
     return lattice
 
 
-def calculate_energy(lattice):
+def checkerboard_update(lattice, beta, color, rows = None, rng = None, topology = None):
     """
-    This functions calculates the lattice energy (with PBC) using the Ising 
-    Hamiltonian with the exchange constant J equal to 1
+    This function uses the Metropolis algorithm to update, all at once, the 
+    spins of one color of the checkerboard, i.e. with (x + y)%2 == color; their 
+    nearest neighbours all have the other color, so they are independent
+
+    Parameters
+    ----------
+    lattice : 2D array
+        lattice spin configuration, updated in place.
+    beta : float
+        1/kT where T is the temperature and the Boltzmann constant k 
+        is taken equal to 1.
+    color : int
+        color of the spins to be updated, either 0 or 1.
+    rows : tuple, optional
+        first and last (excluded) rows to be updated; the rows next to them are 
+        only read. The default is None, that will update all rows.
+    rng : numpy random generator, optional
+        generator of the random numbers. The default is None, that will use np.random.
+    topology : LatticeTopology, optional
+        nearest neighbours of the sites. The default is None, that will use the 
+        square lattice with PBC.
+
+    Returns
+    -------
+        the updated lattice spin configuration.
+    
+    Raises
+    ------
+        ValueError if the topology is not bipartite (e.g. a square lattice with PBC 
+        and odd dimensions, or a triangular lattice), since neighbours could 
+        have the same color.
+
+    """
+    
+    length, width = lattice.shape
+    if topology is None:
+        topology = lt.get_topology(length, width)
+    if not topology.bipartite:
+        raise ValueError('The lattice must be bipartite for the checkerboard update, but the {0} lattice with dimensions {1} and {2} is not\n'.format(topology.kind, length, width))
+    
+    if rows is None:
+        rows = (0, length)
+    if rng is None:
+        rng = np.random
+    
+    first, last = rows
+    strip = lattice[first:last]
+    
+    #Nearest neighbours total spin, reading only the strip and the rows next to it
+    neighbour_spin = topology.neighbour_sum(lattice, rows)
+    
+    #Acceptance probabilities of the energy changes -2z, -2z + 2, ..., 2z, with z the coordination
+    energies = np.arange(-2*topology.coordination, 2*topology.coordination + 1, 2)
+    with np.errstate(over = 'ignore', invalid = 'ignore'):
+        acceptance = np.minimum(np.exp(-beta*energies), 1.0)
+    
+    energy_change = 2*strip*neighbour_spin
+    probability = acceptance[(energy_change.astype(int) + 2*topology.coordination)//2]
+    
+    flip = (topology.colors(rows) == color) & (rng.random(strip.shape) < probability)
+    strip[flip] *= -1
+    
+    return lattice
+
+
+def checkerboard_move(lattice, beta, rng = None, topology = None):
+    """
+    This function updates all the lattice spins with the Metropolis algorithm, 
+    first one color of the checkerboard and then the other; it has the same 
+    equilibrium as metropolis_move
+
+    Parameters
+    ----------
+    lattice : 2D array
+        lattice spin configuration, updated in place.
+    beta : float
+        1/kT where T is the temperature and the Boltzmann constant k 
+        is taken equal to 1.
+    rng : numpy random generator, optional
+        generator of the random numbers. The default is None, that will use np.random.
+    topology : LatticeTopology, optional
+        nearest neighbours of the sites, which must be bipartite. The default is 
+        None, that will use the square lattice with PBC.
+
+    Returns
+    -------
+        the updated lattice spin configuration.
+
+    """
+    
+    for color in (0, 1):
+        checkerboard_update(lattice, beta, color, rng = rng, topology = topology)
+    
+    return lattice
+
+
+def calculate_energy(lattice, topology = None):
+    """
+    This functions calculates the lattice energy (with PBC, unless the topology 
+    has open boundaries) using the Ising Hamiltonian with the exchange constant 
+    J equal to 1
 
     Parameters
     ----------
     lattice : 2D-like array
         lattice spin configuration.
+    topology : LatticeTopology, optional
+        nearest neighbours of the sites. The default is None, that will use the 
+        square lattice with PBC.
 
     Returns
     -------
-        the lattice energy, considering periodic boundary conditions.
+        the lattice energy, considering the boundary conditions of the topology.
 
     """
     
-    total_energy = 0.0
-    
-    #Length and width for looping
-    length = len(lattice)
-    width = len(lattice[0])
+    lattice = np.asarray(lattice)
+    if topology is None:
+        topology = lt.get_topology(*lattice.shape)
     
-    #The energy is given by the product of the (x,y) spin and the 4 nearest neighbours spins.
-    for x in range(length):
-        for y in range(width):
-            site_spin = lattice[x,y]
-            neighbour_spin = lattice[(x+1)%length, y] + lattice[x, (y+1)%width] + lattice[(x-1)%length, y] + lattice[x, (y-1)%width]
-            total_energy += -site_spin*neighbour_spin
+    #The energy is given by the product of the (x,y) spin and its nearest neighbours spins.
+    total_energy = -np.sum(lattice*topology.neighbour_sum(lattice), dtype = float)
     
     #Total energy with no double counting
     return total_energy/2
@@ -163,6 +278,217 @@ def calculate_magnetization(lattice):
     return total_magnetization
 
 
+def structure_factor(lattice):
+    """
+    This function calculates the structure factor of the lattice by FFT, 
+    in O(NM log NM) operations instead of O((NM)^2)
+
+    Parameters
+    ----------
+    lattice : 2D-like array
+        lattice spin configuration.
+
+    Returns
+    -------
+        the N*M structure factor S(k) = |s(k)|^2/(N*M), where s(k) is the discrete 
+        Fourier transform of the spins; S(0) is the squared magnetization divided by N*M.
+
+    """
+    
+    lattice = np.asarray(lattice, dtype = float)
+    
+    return np.abs(np.fft.fft2(lattice))**2/lattice.size
+
+
+def correlation_function(structure, magnetization = 0.0):
+    """
+    This function calculates the spin-spin correlation function (with PBC) from
+    the structure factor by inverse FFT; it can be given the mean of many 
+    structure factors to get the mean correlation function
+
+    Parameters
+    ----------
+    structure : 2D-like array
+        structure factor, as given by structure_factor.
+    magnetization : float, optional
+        mean magnetization per site, whose square is subtracted to get the connected 
+        correlation function. The default is 0.0.
+
+    Returns
+    -------
+        the N*M correlation function G(r), i.e. the mean over the sites x of s(x)*s(x+r).
+
+    """
+    
+    return np.fft.ifft2(structure).real - magnetization**2
+
+
+def correlation_length(structure):
+    """
+    This function calculates the second-moment correlation length from the 
+    structure factor at k = 0 and at the smallest non-zero wave vector along 
+    each lattice direction longer than 1
+
+    Parameters
+    ----------
+    structure : 2D-like array
+        structure factor, as given by structure_factor, or mean of many of them.
+
+    Returns
+    -------
+        the correlation length averaged over the lattice directions; it is infinite 
+        if the structure factor at the smallest wave vector is zero (e.g. for an 
+        ordered lattice).
+    
+    Raises
+    ------
+        ValueError if the lattice is a single point.
+
+    """
+    
+    structure = np.asarray(structure, dtype = float)
+    lengths = []
+    
+    #Smallest non-zero wave vector 2*pi/L along each direction
+    for axis, L in enumerate(structure.shape):
+        if L > 1:
+            k_min = 2*np.pi/L
+            S_min = structure[1, 0] if axis == 0 else structure[0, 1]
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                ratio = np.float64(structure[0, 0])/S_min - 1
+            lengths.append(np.sqrt(max(ratio, 0.0))/(2*np.sin(k_min/2)))
+    
+    if len(lengths) == 0:
+        raise ValueError('The correlation length cannot be calculated for a single point lattice (i.e. M = N = 1)\n')
+    
+    return np.mean(lengths)
+
+
+def label_domains(lattices, topology = None):
+    """
+    This function labels the domains (i.e. the connected clusters of equal spins,
+    with the neighbours of the topology) of a lattice or of a stack of lattices; it only uses array 
+    operations on the whole stack: each site takes the minimum label of its 
+    equal neighbours, the old label of the site is hooked to it and then labels 
+    are replaced by the label of the site they point to, until nothing changes
+
+    Parameters
+    ----------
+    lattices : 2D-like or 3D-like array
+        lattice spin configuration, or stack of configurations along the first axis
+        (e.g. the states returned by simulate).
+    topology : LatticeTopology, optional
+        nearest neighbours of the sites. The default is None, that will use the 
+        square lattice with PBC.
+
+    Returns
+    -------
+        integer array with the shape of lattices, where each site has the flat index 
+        (in the whole stack) of the first site of its domain.
+
+    """
+    
+    lattices = np.asarray(lattices)
+    shape = lattices.shape
+    stack = lattices.reshape((-1,) + shape[-2:])
+    frames = len(stack)
+    
+    if topology is None:
+        topology = lt.get_topology(*shape[-2:])
+    
+    #Neighbours of each site in the flat stack; frames are never connected, and 
+    #missing neighbours point to an extra site, that is never equal
+    offsets = topology.sites*np.arange(frames)[:, None, None]
+    missing = topology.neighbours == topology.sites
+    neighbours = np.where(missing, frames*topology.sites, topology.neighbours + offsets).reshape(frames*topology.sites, -1)
+    
+    spins = np.append(stack.ravel(), 0)
+    equal = spins[neighbours] == spins[:-1, None]
+    
+    labels = np.arange(stack.size)
+    
+    while True:
+        neighbour_labels = np.append(labels, stack.size)[neighbours]
+        new_labels = np.minimum(labels, np.min(np.where(equal, neighbour_labels, stack.size), axis = 1))
+        
+        #Hooking: the site pointed by the old label takes the new label too
+        flat = new_labels
+        np.minimum.at(flat, labels, new_labels.copy())
+        
+        #Pointer jumping, until every label points to a site that points to itself
+        while True:
+            jumped = flat[flat]
+            if np.array_equal(jumped, flat):
+                break
+            flat = jumped
+        
+        if np.array_equal(flat, labels):
+            break
+        labels = flat
+    
+    return labels.reshape(shape)
+
+
+def domain_statistics(lattices, topology = None):
+    """
+    This function calculates the domain statistics of a lattice or of a stack 
+    of lattices, with the neighbours of the topology
+
+    Parameters
+    ----------
+    lattices : 2D-like or 3D-like array
+        lattice spin configuration, or stack of configurations along the first axis
+        (e.g. the states returned by simulate).
+    topology : LatticeTopology, optional
+        nearest neighbours of the sites. The default is None, that will use the 
+        square lattice with PBC.
+
+    Returns
+    -------
+        dictionary with, for each lattice, the number of domains 'numb_domains', 
+        the fraction of sites in the largest domain 'largest_fraction', the number 
+        of nearest neighbour bonds between opposite spins 'wall_length' and the 
+        list 'size_histogram' of arrays with the number of domains of each size.
+
+    """
+    
+    lattices = np.asarray(lattices)
+    stack = lattices.reshape((-1,) + lattices.shape[-2:])
+    frames = len(stack)
+    sites = stack[0].size
+    
+    if topology is None:
+        topology = lt.get_topology(*stack.shape[1:])
+    
+    labels = label_domains(stack, topology).ravel()
+    
+    #Every domain is counted at its first site, whose label is its own index
+    roots = np.flatnonzero(labels == np.arange(labels.size))
+    sizes = np.bincount(labels, minlength = labels.size)[roots]
+    frame_of_root = roots//sites
+    
+    numb_domains = np.bincount(frame_of_root, minlength = frames)
+    largest = np.zeros(frames, dtype = int)
+    np.maximum.at(largest, frame_of_root, sizes)
+    
+    #Roots are sorted, so the domains of each frame are contiguous
+    boundaries = np.cumsum(numb_domains)[:-1]
+    size_histogram = [np.bincount(frame_sizes) for frame_sizes in np.split(sizes, boundaries)]
+    
+    #Each bond is seen from both its sites; missing neighbours have spin 0 and are not counted
+    flat = stack.reshape(frames, -1)
+    spins = np.concatenate([flat, np.zeros((frames, 1), dtype = flat.dtype)], axis = 1)
+    neighbour_spins = spins[:, topology.neighbours]
+    wall_length = np.sum((neighbour_spins != flat[:, :, None]) & (neighbour_spins != 0), axis = (1, 2))//2
+    
+    if lattices.ndim == 2:
+        return {'numb_domains': numb_domains[0], 'largest_fraction': largest[0]/sites, 
+                'wall_length': wall_length[0], 'size_histogram': size_histogram[0]}
+    
+    return {'numb_domains': numb_domains, 'largest_fraction': largest/sites, 
+            'wall_length': wall_length, 'size_histogram': size_histogram}
+
+
 def read_configuration(filename):
     """
     This function reads a configuration file
@@ -278,7 +604,7 @@ def save_temp_data(ene, mag, ene_path = 'ene_temp.txt', mag_path = 'mag_temp.txt
         raise IOError('It may be that you do not have the permission to create or open the file; if you want to save the data, try to create an empty file with the name of the save path\n')
       
 
-def simulate(lattice, beta, times = (5, 10, 50, 100, 1000)):
+def simulate(lattice, beta, times = (5, 10, 50, 100, 1000), topology = None):
     """
     This function simulates the lattice evolution for a given 
     number of steps (i.e. time)
@@ -293,6 +619,9 @@ def simulate(lattice, beta, times = (5, 10, 50, 100, 1000)):
     times : 1D-like array, optional
         five time instants when to store the evolved lattice spin configuration. 
         The default is (5, 10, 50, 100, 1000).
+    topology : LatticeTopology, optional
+        nearest neighbours of the sites. The default is None, that will use the 
+        square lattice with PBC.
 
     Returns
     -------
@@ -306,7 +635,7 @@ def simulate(lattice, beta, times = (5, 10, 50, 100, 1000)):
     
     #Take data from selected points in evolution time
     for time in range(evolution_steps):
-        evolved_state = metropolis_move(lattice, beta)
+        evolved_state = metropolis_move(lattice, beta, topology)
         if time in times:
             added_state = evolved_state.copy()
             states_evolution.append(added_state)
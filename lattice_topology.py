@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 18:56:42 2026
+"""
+
+
+import numpy as np
+import functools
+
+
+#Lattice geometries that can be built
+KINDS = ('square', 'triangular', 'honeycomb')
+
+
+class LatticeTopology:
+    """
+    This class holds the nearest neighbours of every site of an N*M lattice,
+    as flat indices computed once, so that neighbour sums are gathered with
+    fancy indexing instead of modulo arithmetic at every site visit; the square
+    lattice with PBC gathers them from shifted rows, without any table.
+    Sites are numbered x*M + y; a missing neighbour (at an open boundary) is
+    given the index N*M, that points to an extra spin equal to 0. With
+    periodic boundaries, neighbours are kept even if repeated (e.g. when a
+    dimension is 2), as in calculate_energy.
+
+    Parameters
+    ----------
+    N : int
+        length of the lattice.
+    M : int
+        width of the lattice.
+    kind : string, optional
+        geometry, one of KINDS: 'square' (4 neighbours), 'triangular' (6 neighbours,
+        the square ones plus (x+1, y-1) and (x-1, y+1)) or 'honeycomb' (3 neighbours,
+        as a brick wall: (x, y+1), (x, y-1) and (x+1, y) or (x-1, y) when x + y is
+        even or odd). The default is 'square'.
+    periodic : bool, optional
+        if True, PBC are used, otherwise boundaries are open. The default is True.
+
+    Raises
+    ------
+        ValueError if lattice dimensions are < 1, if the geometry is unknown, or
+        if a periodic honeycomb lattice has odd dimensions.
+
+    """
+
+    def __init__(self, N, M, kind = 'square', periodic = True):
+        if N < 1 or M < 1:
+            raise ValueError('Both lattice dimensions must be >= 1, but are {0} and {1}\n'.format(N, M))
+        if kind not in KINDS:
+            raise ValueError('The lattice geometry must be one of {0}, but is {1}\n'.format(KINDS, kind))
+        if kind == 'honeycomb' and periodic == True and (N%2 != 0 or M%2 != 0):
+            raise ValueError('Both lattice dimensions must be even for a periodic honeycomb lattice, but are {0} and {1}\n'.format(N, M))
+
+        self.shape = (N, M)
+        self.sites = N*M
+        self.kind = kind
+        self.periodic = periodic
+
+        #Neighbours can be colored with two colors, (x + y)%2, unless some of them have the
+        #same parity: along a periodic odd dimension (or of length 1), or in the triangular lattice
+        if kind == 'triangular':
+            self.bipartite = False
+        elif kind == 'square' and periodic == True:
+            self.bipartite = N%2 == 0 and M%2 == 0
+        else:
+            self.bipartite = True
+
+        #Tables are only built when they are used; the square lattice with PBC does not need
+        #them to calculate neighbour sums
+        self._neighbours = None
+        self._neighbour_lists = None
+
+    @property
+    def coordination(self):
+        """
+        Number of nearest neighbours of a site away from open boundaries.
+
+        """
+
+        return {'square': 4, 'triangular': 6, 'honeycomb': 3}[self.kind]
+
+    @property
+    def neighbours(self):
+        """
+        (N*M, coordination) table of the neighbours of each site, as 32-bit flat
+        indices (64-bit for more than 2**31 - 1 sites); built the first time it is used.
+
+        """
+
+        if self._neighbours is None:
+            N, M = self.shape
+            dtype = np.int32 if self.sites < 2**31 - 1 else np.int64
+            x, y = np.divmod(np.arange(self.sites, dtype = dtype), M)
+
+            #Displacements (dx, dy) of the neighbours of each site
+            displacements = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+            if self.kind == 'triangular':
+                displacements += [(1, -1), (-1, 1)]
+            elif self.kind == 'honeycomb':
+                displacements = [(0, 1), (0, -1), (1 - 2*((x + y)%2), 0)]
+
+            self._neighbours = np.empty((self.sites, len(displacements)), dtype = dtype)
+            for column, (dx, dy) in enumerate(displacements):
+                nx = x + dx
+                ny = y + dy
+                if self.periodic == True:
+                    self._neighbours[:, column] = (nx%N)*M + ny%M
+                else:
+                    inside = (nx >= 0) & (nx < N) & (ny >= 0) & (ny < M)
+                    self._neighbours[:, column] = np.where(inside, nx*M + ny, self.sites)
+
+        return self._neighbours
+
+    @property
+    def neighbour_lists(self):
+        """
+        Lists of the neighbours of each site, without the missing ones, for
+        loops over single sites; built the first time they are used.
+
+        """
+
+        if self._neighbour_lists is None:
+            self._neighbour_lists = [[neighbour for neighbour in site_neighbours if neighbour != self.sites] for site_neighbours in self.neighbours.tolist()]
+
+        return self._neighbour_lists
+
+    def colors(self, rows = None):
+        """
+        This function gives the checkerboard color (x + y)%2 of the sites, such
+        that neighbours always have different colors if the lattice is bipartite
+
+        Parameters
+        ----------
+        rows : tuple, optional
+            first and last (excluded) rows of the sites. The default is None, that will use all rows.
+
+        Returns
+        -------
+            array with the color, 0 or 1, of each site of the rows.
+
+        """
+
+        if rows is None:
+            rows = (0, self.shape[0])
+        x, y = np.ogrid[rows[0]:rows[1], 0:self.shape[1]]
+
+        return (x + y)%2
+
+    def neighbour_sum(self, lattice, rows = None):
+        """
+        This function calculates the nearest neighbours total spin of every site;
+        only the rows and the ones next to them are read, so the cost is
+        proportional to the number of rows
+
+        Parameters
+        ----------
+        lattice : 2D-like array
+            lattice spin configuration.
+        rows : tuple, optional
+            first and last (excluded) rows of the sites. The default is None, that will use all rows.
+
+        Returns
+        -------
+            array with the neighbours total spin of each site of the rows.
+
+        """
+
+        if rows is None:
+            rows = (0, self.shape[0])
+        first, last = rows
+        lattice = np.asarray(lattice)
+
+        #Square lattice with PBC: the rows above and below, and the rows rolled along the width
+        if self.kind == 'square' and self.periodic == True:
+            strip = lattice[first:last]
+            return lattice[(np.arange(first, last) + 1)%self.shape[0]] + lattice[(np.arange(first, last) - 1)%self.shape[0]] + np.roll(strip, 1, 1) + np.roll(strip, -1, 1)
+
+        #The flat view does not copy the lattice; missing neighbours count as spin 0
+        flat = np.ravel(lattice)
+        neighbours = self.neighbours[first*self.shape[1]:last*self.shape[1]]
+        if self.periodic == True:
+            spins = flat[neighbours]
+        else:
+            missing = neighbours == self.sites
+            spins = flat[np.where(missing, 0, neighbours)]
+            spins[missing] = 0
+
+        return np.sum(spins, axis = 1).reshape(last - first, self.shape[1])
+
+    def __getstate__(self):
+        """
+        Tables are not pickled (e.g. when the topology is given to worker
+        processes), and are built again where they are used.
+
+        """
+
+        state = self.__dict__.copy()
+        state['_neighbours'] = None
+        state['_neighbour_lists'] = None
+
+        return state
+
+
+@functools.lru_cache(maxsize = 32)
+def get_topology(N, M, kind = 'square', periodic = True):
+    """
+    This function gives the topology of a lattice, built only the first time
+
+    Parameters
+    ----------
+    N : int
+        length of the lattice.
+    M : int
+        width of the lattice.
+    kind : string, optional
+        geometry, one of KINDS. The default is 'square'.
+    periodic : bool, optional
+        if True, PBC are used, otherwise boundaries are open. The default is True.
+
+    Returns
+    -------
+        the LatticeTopology, shared by all the calls with the same arguments.
+
+    """
+
+    return LatticeTopology(N, M, kind, periodic)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 18:45:43 2026
+"""
+
+
+import lattice_topology as lt
+import numpy as np
+import math
+
+
+#Number of random numbers drawn at once
+BUFFER_SIZE = 4096
+
+
+class NFoldWay:
+    """
+    This class evolves the lattice with the rejection-free n-fold way (BKL)
+    algorithm: spins are kept in buckets by their value and their nearest
+    neighbours total spin, a bucket is chosen with probability
+    proportional to its total Metropolis flip rate and a spin of it is flipped,
+    and the time is advanced by the exponentially distributed waiting time.
+    Only the flipped spin and its neighbours change bucket after each flip, and
+    rejected moves are never proposed, so at low temperature time is spent only
+    on the flips that happen.
+    Time is measured in sweeps, i.e. in units of N*M Metropolis attempts, so
+    that a time t corresponds on average to t calls of metropolis_move.
+
+    Parameters
+    ----------
+    lattice : 2D array
+        lattice spin configuration, updated in place.
+    beta : float
+        1/kT where T is the temperature and the Boltzmann constant k
+        is taken equal to 1.
+    rng : numpy random generator, optional
+        generator of the random numbers. The default is None, that will use np.random.
+    topology : LatticeTopology, optional
+        nearest neighbours of the sites. The default is None, that will use the 
+        square lattice with PBC.
+
+    Raises
+    ------
+        ValueError if the lattice is not contiguous, since it could not be updated in place.
+
+    """
+
+    def __init__(self, lattice, beta, rng = None, topology = None):
+        self.lattice = lattice
+        self.beta = beta
+        self.time = 0.0
+        self._rng = np.random if rng is None else rng
+        self._buffer = []
+
+        length, width = lattice.shape
+        self._sites = length*width
+        self._flat = lattice.reshape(-1)
+        if not np.shares_memory(self._flat, lattice):
+            raise ValueError('The lattice must be a contiguous array, to be updated in place\n')
+
+        if topology is None:
+            topology = lt.get_topology(length, width)
+        self._neighbours = topology.neighbour_lists
+        self._coordination = topology.coordination
+
+        #Flip rates of spin -1 and +1 (bucket (2z + 1)*(s > 0)) with neighbours total spin -z, ..., z,
+        #with z the coordination
+        self._rates = []
+        for spin in (-1, 1):
+            for neighbour_spin in range(-self._coordination, self._coordination + 1):
+                energy_change = 2*spin*neighbour_spin
+                self._rates.append(1.0 if energy_change <= 0 else math.exp(-beta*energy_change))
+
+        #Buckets of sites, with the position of each site in its bucket for removal in O(1)
+        self._spins = [int(spin) for spin in self._flat]
+        self._buckets = [[] for rate in self._rates]
+        self._bucket = [0]*self._sites
+        self._position = [0]*self._sites
+        for site in range(self._sites):
+            self._add(site, self._bucket_of(site))
+
+    def _bucket_of(self, site):
+        """
+        This function gives the bucket of a site from its spin and its neighbours
+
+        """
+
+        neighbour_spin = 0
+        for neighbour in self._neighbours[site]:
+            neighbour_spin += self._spins[neighbour]
+
+        return (2*self._coordination + 1)*(self._spins[site] > 0) + neighbour_spin + self._coordination
+
+    def _add(self, site, bucket):
+        """
+        This function adds a site to a bucket
+
+        """
+
+        self._bucket[site] = bucket
+        self._position[site] = len(self._buckets[bucket])
+        self._buckets[bucket].append(site)
+
+    def _remove(self, site):
+        """
+        This function removes a site from its bucket, moving the last site of the
+        bucket in its place
+
+        """
+
+        members = self._buckets[self._bucket[site]]
+        last = members.pop()
+        if last != site:
+            position = self._position[site]
+            members[position] = last
+            self._position[last] = position
+
+    def _random(self):
+        """
+        This function gives a uniform random number in [0, 1), drawn in blocks
+
+        """
+
+        if len(self._buffer) == 0:
+            self._buffer = self._rng.random(BUFFER_SIZE).tolist()
+
+        return self._buffer.pop()
+
+    def total_rate(self):
+        """
+        This function calculates the total flip rate of the lattice
+
+        Returns
+        -------
+            expected number of flips per sweep, i.e. the sum of the flip probabilities of all spins.
+
+        """
+
+        return sum(rate*len(members) for rate, members in zip(self._rates, self._buckets))
+
+    def run(self, time):
+        """
+        This function evolves the lattice for a given time, flipping spins one
+        at a time; the flip that would happen after the given time is discarded,
+        which is exact since waiting times have no memory
+
+        Parameters
+        ----------
+        time : float
+            time to evolve the lattice for, in sweeps.
+
+        Returns
+        -------
+            the evolved lattice spin configuration.
+
+        """
+
+        end = self.time + time
+
+        while True:
+            weights = [rate*len(members) for rate, members in zip(self._rates, self._buckets)]
+            total = sum(weights)
+
+            #No spin can flip, e.g. at zero temperature in a local minimum
+            if total == 0:
+                self.time = end
+                break
+
+            #Each site is attempted once per sweep on average, so the total rate is per sweep
+            waiting_time = -math.log(1.0 - self._random())/total
+            if self.time + waiting_time > end:
+                self.time = end
+                break
+            self.time += waiting_time
+
+            #Choose a bucket with probability proportional to its total rate, then a spin in it
+            threshold = self._random()*total
+            for bucket, weight in enumerate(weights):
+                if weight > 0:
+                    chosen = bucket
+                    threshold -= weight
+                    if threshold < 0:
+                        break
+            members = self._buckets[chosen]
+            site = members[min(int(self._random()*len(members)), len(members) - 1)]
+
+            self._flip(site)
+
+        return self.lattice
+
+    def _flip(self, site):
+        """
+        This function flips a spin and moves it and its neighbours to their new buckets
+
+        """
+
+        self._spins[site] = -self._spins[site]
+        self._flat[site] = self._spins[site]
+
+        for changed in set([site] + self._neighbours[site]):
+            self._remove(changed)
+            self._add(changed, self._bucket_of(changed))
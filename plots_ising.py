@@ -12,7 +12,7 @@ import matplotlib.pyplot as plt
 import logging 
 
 
-def plots_T(T, energy, magnetization, saving = True, save_path = 'temperature_plot.png', load = False, load_path = ('ene_temp_path', 'mag_temp_path')):
+def plots_T(T, energy, magnetization, saving = True, save_path = 'temperature_plot.png', load = False, load_path = ('ene_temp_path', 'mag_temp_path'), mag_label = 'Magnetization'):
     """
     This function plots energy and magnetization vs temperature, with data that is
     either given or loaded, and can save it 
@@ -34,6 +34,9 @@ def plots_T(T, energy, magnetization, saving = True, save_path = 'temperature_pl
     load_path : 1D-like array, optional
         list of strings of two files from which to load data; the first should be
         for the energy. The default is ('ene_temp_path', 'mag_temp_path').
+    mag_label : string, optional
+        label of the magnetization axis, e.g. 'RMS magnetization' for exact results.
+        The default is 'Magnetization'.
 
     Returns
     -------
@@ -71,7 +74,7 @@ def plots_T(T, energy, magnetization, saving = True, save_path = 'temperature_pl
     sub_f =  f.add_subplot(1, 2, 2);
     plt.scatter(T, abs(magnetization), s = 50, marker = 'o', color = 'RoyalBlue')
     plt.xlabel("Temperature ", fontsize = 22)
-    plt.ylabel("Magnetization ", fontsize = 22)   
+    plt.ylabel("{0} ".format(mag_label), fontsize = 22)   
     
     #Saving
     if saving == True:
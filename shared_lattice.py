@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 18:43:58 2026
+"""
+
+
+import functions_ising as fi
+import lattice_topology as lt
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+
+
+def _strip_worker(name, shape, dtype, rows, seed, beta, sweeps, start, done, half_sweep, topology, poll_interval):
+    """
+    This function runs in each worker process: it attaches to the shared
+    lattice and, every time it is started, updates its strip of rows for the
+    requested number of sweeps, waiting for all the other strips after each
+    half-sweep so that the rows next to the strip are up to date; it stops if
+    the main process is not alive anymore
+
+    Parameters
+    ----------
+    name : string
+        name of the shared memory block of the lattice.
+    shape : tuple
+        shape of the lattice.
+    dtype : numpy dtype
+        type of the lattice spins.
+    rows : tuple
+        first and last (excluded) rows of the strip.
+    seed : numpy SeedSequence
+        seed of the random numbers of the worker.
+    beta : multiprocessing Value
+        shared 1/kT.
+    sweeps : multiprocessing Value
+        shared number of sweeps to be done; 0 stops the worker.
+    start : multiprocessing Semaphore
+        released by the main process once for each worker before the sweeps.
+    done : multiprocessing Semaphore
+        released by each worker after the sweeps.
+    half_sweep : multiprocessing Barrier
+        barrier of the workers after each half-sweep.
+    topology : LatticeTopology
+        nearest neighbours of the sites.
+    poll_interval : float
+        seconds between checks of the main process while waiting to start.
+
+    Returns
+    -------
+        None.
+
+    """
+
+    memory = shared_memory.SharedMemory(name = name)
+    lattice = np.ndarray(shape, dtype = dtype, buffer = memory.buf)
+    rng = np.random.default_rng(seed)
+    parent = multiprocessing.parent_process()
+
+    try:
+        while True:
+            while not start.acquire(timeout = poll_interval):
+                if parent is not None and not parent.is_alive():
+                    return
+            if sweeps.value == 0:
+                break
+
+            for i in range(sweeps.value):
+                for color in (0, 1):
+                    fi.checkerboard_update(lattice, beta.value, color, rows, rng, topology)
+                    half_sweep.wait()
+
+            done.release()
+    finally:
+        del lattice
+        memory.close()
+
+
+class SharedLattice:
+    """
+    This class holds a single lattice in shared memory, split into strips of
+    rows, each updated by a worker process with the checkerboard Metropolis
+    algorithm; the rows next to each strip are read directly from the shared
+    lattice, and are synchronized by waiting for all workers between
+    half-sweeps. Between calls of sweep, the lattice can be read (e.g. to
+    calculate energy and magnetization) or changed in place.
+    To be used as a context manager, or closed with close.
+
+    Parameters
+    ----------
+    lattice : 2D-like array
+        initial lattice spin configuration.
+    beta : float
+        1/kT where T is the temperature and the Boltzmann constant k
+        is taken equal to 1.
+    workers : int, optional
+        number of worker processes. The default is None, that will use all the cores.
+    seed : int, optional
+        seed of the random numbers of the workers. The default is 42.
+    topology : LatticeTopology, optional
+        nearest neighbours of the sites, which must be bipartite. The default is
+        None, that will use the square lattice with PBC, with even dimensions.
+    poll_interval : float, optional
+        seconds between checks that the workers are alive, while waiting for
+        them. The default is 0.1.
+
+    Raises
+    ------
+        ValueError if the topology is not bipartite, or if there are more
+        workers than pairs of rows.
+
+    """
+
+    def __init__(self, lattice, beta, workers = None, seed = 42, topology = None, poll_interval = 0.1):
+        lattice = np.asarray(lattice)
+        length, width = lattice.shape
+
+        if topology is None:
+            topology = lt.get_topology(length, width)
+        if not topology.bipartite:
+            raise ValueError('The lattice must be bipartite for the checkerboard update, but the {0} lattice with dimensions {1} and {2} is not\n'.format(topology.kind, length, width))
+
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+
+        #Strips are made of pairs of rows, so that each one has both colors
+        if not 1 <= workers <= length//2:
+            raise ValueError('The number of workers must be between 1 and half the lattice length ({0}), but is {1}\n'.format(length//2, workers))
+
+        #The main process never waits on the barrier of the workers, but on semaphores with a
+        #timeout, so that it can check that the workers are alive and is never left waiting alone
+        self._beta = multiprocessing.Value('d', beta, lock = False)
+        self._sweeps = multiprocessing.Value('l', 0, lock = False)
+        self._start = multiprocessing.Semaphore(0)
+        self._done = multiprocessing.Semaphore(0)
+        half_sweep = multiprocessing.Barrier(workers)
+        self._poll_interval = poll_interval
+
+        boundaries = 2*np.linspace(0, length//2, workers + 1).astype(int)
+        boundaries[-1] = length
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+
+        #The shared memory is freed if the workers cannot be started
+        self._workers = []
+        self._memory = shared_memory.SharedMemory(create = True, size = lattice.nbytes)
+        try:
+            self.lattice = np.ndarray(lattice.shape, dtype = lattice.dtype, buffer = self._memory.buf)
+            self.lattice[:] = lattice
+
+            for i in range(workers):
+                worker = multiprocessing.Process(target = _strip_worker, args = (self._memory.name, lattice.shape, lattice.dtype, (boundaries[i], boundaries[i+1]), seeds[i], self._beta, self._sweeps, self._start, self._done, half_sweep, topology, poll_interval), daemon = True)
+                worker.start()
+                self._workers.append(worker)
+        except BaseException:
+            self._abort()
+            raise
+
+    @property
+    def beta(self):
+        """
+        1/kT of the next sweeps.
+
+        """
+
+        return self._beta.value
+
+    @beta.setter
+    def beta(self, beta):
+        self._beta.value = beta
+
+    def _wait_done(self):
+        """
+        This function waits until all workers have finished their sweeps,
+        checking that they are all alive
+
+        Returns
+        -------
+            None.
+
+        Raises
+        ------
+            RuntimeError if a worker stopped.
+
+        """
+
+        for worker in self._workers:
+            while not self._done.acquire(timeout = self._poll_interval):
+                for dead in self._workers:
+                    if not dead.is_alive():
+                        raise RuntimeError('A worker of the shared lattice stopped with exit code {0}\n'.format(dead.exitcode))
+
+    def _abort(self):
+        """
+        This function stops the workers at once (e.g. after an interruption or
+        when a worker stopped) and frees the shared memory; the workers are
+        terminated instead of aborting the half-sweep barrier, whose lock may
+        be held by a worker that was killed
+
+        Returns
+        -------
+            None.
+
+        """
+
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+        if self._memory is None:
+            return
+
+        if hasattr(self, 'lattice'):
+            del self.lattice
+        self._memory.unlink()
+
+        #Views of the lattice may still be used by the caller (e.g. when a run is interrupted);
+        #the memory is then released after them, when the shared lattice is deleted
+        try:
+            self._memory.close()
+        except BufferError:
+            self._exported = self._memory
+        self._memory = None
+
+    def sweep(self, sweeps = 1):
+        """
+        This function updates the whole lattice for a given number of sweeps;
+        if it is interrupted or a worker stops, the workers are stopped and
+        the shared memory is freed
+
+        Parameters
+        ----------
+        sweeps : int, optional
+            number of sweeps. The default is 1.
+
+        Returns
+        -------
+            the shared lattice spin configuration.
+
+        Raises
+        ------
+            ValueError if the number of sweeps is < 1, RuntimeError if the
+            shared lattice is closed or a worker stopped.
+
+        """
+
+        if sweeps < 1:
+            raise ValueError('The number of sweeps must be >= 1, but is {0}\n'.format(sweeps))
+        if self._memory is None:
+            raise RuntimeError('The shared lattice is closed\n')
+
+        try:
+            self._sweeps.value = sweeps
+            for worker in self._workers:
+                self._start.release()
+            self._wait_done()
+        except BaseException:
+            self._abort()
+            raise
+
+        return self.lattice
+
+    def close(self):
+        """
+        This function stops the workers and frees the shared memory; the lattice
+        must be copied before, if it is still needed
+
+        Returns
+        -------
+            None.
+
+        """
+
+        if self._memory is None:
+            return
+
+        try:
+            self._sweeps.value = 0
+            for worker in self._workers:
+                self._start.release()
+            for worker in self._workers:
+                worker.join(timeout = 10*self._poll_interval)
+        finally:
+            self._abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+def parallel_checkerboard(lattice, beta, sweeps = 1, workers = None, seed = 42, topology = None):
+    """
+    This function updates a lattice for a given number of sweeps, split into
+    strips updated in parallel by worker processes
+
+    Parameters
+    ----------
+    lattice : 2D-like array
+        lattice spin configuration.
+    beta : float
+        1/kT where T is the temperature and the Boltzmann constant k
+        is taken equal to 1.
+    sweeps : int, optional
+        number of sweeps. The default is 1.
+    workers : int, optional
+        number of worker processes. The default is None, that will use all the cores.
+    seed : int, optional
+        seed of the random numbers of the workers. The default is 42.
+    topology : LatticeTopology, optional
+        nearest neighbours of the sites, which must be bipartite. The default is
+        None, that will use the square lattice with PBC.
+
+    Returns
+    -------
+        an updated copy of the lattice spin configuration.
+
+    """
+
+    with SharedLattice(lattice, beta, workers, seed, topology) as shared:
+        return shared.sweep(sweeps).copy()
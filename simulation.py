@@ -7,133 +7,846 @@ Created on Tue Dec 14 14:55:28 2021
 
 
 import functions_ising as fi
-import plots_ising as pi
+import cache_ising as cc
+import lattice_topology as lt
+import nfold_way as nw
+import transfer_matrix as tm
+import shared_lattice as sl
 import numpy as np
-from tqdm import trange
+import argparse
+import multiprocessing
 import logging
 import sys
+import time
 
 
-#Import configuration, default or read by command line
-filename = 'CONFIGURATION.ini'
-if len(sys.argv) > 1:
-    filename = sys.argv[1]
-configuration = fi.read_configuration(filename)
+#Default paths, same as the ones in CONFIGURATION.ini
+DEFAULT_PATHS = {'ene_temp_path': 'ene_temp.txt', 'mag_temp_path': 'mag_temp.txt',
+                 'ene_steps_path': 'ene_steps.txt', 'mag_steps_path': 'mag_steps.txt',
+                 'temp_plots_path': 'temperature_plot.png', 'steps_plots_path': 'steps_plot.png',
+                 'evo_plots_path': 'evolution_plot.png', 'mag_rms_temp_path': 'mag_rms_temp.txt'}
 
-N = configuration.getint('SETTINGS', 'N')
-M = configuration.getint('SETTINGS', 'M')
+#Version of the temperature point simulation, part of the cache key; to be increased when its results change
+ENGINE_VERSION = 2
 
-eq_steps = configuration.getint('SETTINGS', 'eq_steps')
-mc_steps = configuration.getint('SETTINGS', 'mc_steps')
+#Algorithms that can update the lattice between measurements
+ENGINES = ('metropolis', 'checkerboard', 'nfold', 'exact', 'shared')
 
-numb_T = configuration.getint('SETTINGS', 'numb_T')
-T_init = configuration.getfloat('SETTINGS', 'T_init')
-T_final = configuration.getfloat('SETTINGS', 'T_final')
 
-spin_up_pol = configuration.getfloat('SETTINGS', 'spin_up_pol')
+def run_temperature_point(N, M, T, seed = 42, spin_up_pol = None, eq_steps = 1000, mc_steps = 1000, record_steps = False, correlation = False, cache_dir = None, cache_size = None, engine = 'metropolis', topology = 'square', periodic = True, workers = None):
+    """
+    This function simulates a single temperature point: the lattice is initialized
+    from the seed, equilibrated and then energy and magnetization are averaged;
+    since it only depends on its arguments, it can be run independently by any process
 
-level = configuration.getint('LOGGING', 'level')
+    Parameters
+    ----------
+    N : int
+        length of the lattice.
+    M : int
+        width of the lattice.
+    T : float
+        temperature, with the Boltzmann constant k taken equal to 1.
+    seed : int, optional
+        seed of the initial state and of the evolution. The default is 42.
+    spin_up_pol : float, optional
+        mean spin up polarization. The default is None, that will generate a random lattice.
+    eq_steps : int, optional
+        steps waited before starting the acquisition of observables. The default is 1000.
+    mc_steps : int, optional
+        steps used to calculate thermodinamical averages. The default is 1000.
+    record_steps : bool, optional
+        if True, total energy and magnetization are also stored at every step. The default is False.
+    correlation : bool, optional
+        if True, the structure factor is accumulated over the measurement steps and
+        the correlation length is calculated from its mean. The default is False.
+    cache_dir : string, optional
+        directory of the cache of temperature points; already computed points are
+        loaded instead of simulated. The default is None, that will not use the cache.
+    cache_size : int, optional
+        maximum size of the cache in bytes. The default is None, that will never evict points.
+    engine : string, optional
+        algorithm updating the lattice between measurements, one of ENGINES: 'metropolis'
+        (metropolis_move), 'checkerboard' (checkerboard_move, for even dimensions),
+        'nfold' (the rejection-free NFoldWay, evolved for one sweep of time, faster at
+        low temperature), 'exact' (exact averages by transfer matrix, for lattices with
+        a dimension up to transfer_matrix.MAX_WIDTH, where the mean magnetization is
+        zero by symmetry and the root mean square one is given instead; seed and steps
+        are not used) or 'shared' (the checkerboard update of a single lattice in shared
+        memory, split into strips of rows updated by the same worker processes for all
+        steps, for huge lattices). The default is 'metropolis'.
+    topology : string, optional
+        lattice geometry, one of lattice_topology.KINDS; the checkerboard and shared
+        engines need a bipartite one. The default is 'square'.
+    periodic : bool, optional
+        if True, PBC are used, otherwise boundaries are open. The default is True.
+    workers : int, optional
+        number of worker processes of the shared engine, part of the cache key since
+        each one has its own random numbers. The default is None, that will use all the cores.
 
-seed = configuration.getint('SETTINGS', 'seed')
+    Returns
+    -------
+        dictionary with the temperature 'T' and the intensive mean 'energy' and
+        'magnetization'; if record_steps is True, also lists 'ene_steps' and 'mag_steps';
+        if correlation is True, also the mean 'structure_factor' (as nested lists) and
+        the 'correlation_length'; if engine is 'exact', 'magnetization' is replaced by the
+        root mean square 'magnetization_rms' and the mean square 'magnetization2' per
+        site, and there are also the 'specific_heat' and 'susceptibility' per site.
 
-nT_show = configuration.getint('PLOTTING', 'nT_show')
+    Raises
+    ------
+        ValueError if the number of Monte Carlo steps is < 1, if the engine is unknown,
+        if data vs steps or correlation are asked to the exact engine, if the exact
+        engine or correlation are asked for a lattice other than square with PBC, or
+        if both lattice dimensions are too large for the exact engine.
 
-t1 = configuration.getint('PLOTTING', 't1')
-t2 = configuration.getint('PLOTTING', 't2')
-t3 = configuration.getint('PLOTTING', 't3')
-t4 = configuration.getint('PLOTTING', 't4')
-t5 = configuration.getint('PLOTTING', 't5')
-times = (t1, t2, t3, t4, t5)
+    """
 
-ene_temp_path = configuration.get('PATHS', 'ene_temp_path')
-mag_temp_path = configuration.get('PATHS', 'mag_temp_path')
-ene_steps_path = configuration.get('PATHS', 'ene_steps_path')
-mag_steps_path = configuration.get('PATHS', 'mag_steps_path')
-save_data = configuration.getboolean('PATHS', 'save_data')
-save_plots = configuration.getboolean('PATHS', 'save_plots')
+    if mc_steps < 1:
+        raise ValueError('The number of Monte Carlo steps must be >= 1, but is {0}\n'.format(mc_steps))
 
-temp_plots_path = configuration.get('PATHS', 'temp_plots_path')
-steps_plots_path = configuration.get('PATHS', 'steps_plots_path')
-evo_plots_path = configuration.get('PATHS', 'evo_plots_path')
+    if engine not in ENGINES:
+        raise ValueError('The engine must be one of {0}, but is {1}\n'.format(ENGINES, engine))
 
-#Get normalization factor by dividing by number of steps and system size to get intensive values
-norm_intensive = 1.0/(mc_steps*N*M)
+    if engine == 'exact' and (record_steps == True or correlation == True):
+        raise ValueError('Data vs steps and correlation are not available with the exact engine\n')
 
-T = np.linspace(T_init, T_final, numb_T)
-energy = np.zeros(numb_T)
-magnetization =  np.zeros(numb_T)
+    if (engine == 'exact' or correlation == True) and (topology != 'square' or periodic != True):
+        raise ValueError('The exact engine and correlation are only available for the square lattice with PBC\n')
 
-T_show = T[nT_show]
-beta_show = 1.0/T_show
+    if engine == 'exact':
+        tm.check_width(N, M)
 
-x_step = range(eq_steps + mc_steps)
-y_ene = []
-y_mag = []
+    #Everything the observables depend on
+    if cache_dir is not None:
+        parameters = {'N': N, 'M': M, 'T': T, 'seed': seed, 'spin_up_pol': spin_up_pol,
+                      'eq_steps': eq_steps, 'mc_steps': mc_steps, 'engine': engine, 'engine_version': ENGINE_VERSION,
+                      'topology': topology, 'periodic': periodic}
+        if engine == 'shared':
+            if workers is None:
+                workers = multiprocessing.cpu_count()
+            parameters['workers'] = workers
+        required = []
+        if record_steps == True:
+            required += ['ene_steps', 'mag_steps']
+        if correlation == True:
+            required += ['structure_factor', 'correlation_length']
+        point = cc.load_point(parameters, cache_dir, required)
+        if point is not None:
+            return point
 
-#Logging
-logging.basicConfig(level = level)
+    if engine == 'exact':
+        point = _exact_point(N, M, T)
+        if cache_dir is not None:
+            cc.save_point(parameters, point, cache_dir, cache_size)
+        return point
 
-#Initial state
-initial_state = fi.initialize_state(N, M, spin_up_pol, seed)  
+    config = fi.initialize_state(N, M, spin_up_pol, seed)
 
+    #Beta value, with Boltzmann constant k = 1
+    beta = 1.0/T
 
-for n_temp in trange(numb_T, desc = 'Loop over temperature values', position = 0):
-    config = initial_state.copy()     
-    
+    #Neighbour tables, shared by the update and the energy
+    neighbours = lt.get_topology(N, M, topology, periodic)
+
+    #Each step is a sweep of the chosen engine
+    if engine == 'metropolis':
+        move = lambda config: fi.metropolis_move(config, beta, neighbours)
+    elif engine == 'checkerboard':
+        move = lambda config: fi.checkerboard_move(config, beta, topology = neighbours)
+    elif engine == 'nfold':
+        nfold = nw.NFoldWay(config, beta, topology = neighbours)
+        move = lambda config: nfold.run(1)
+    else:
+        #The workers are started once, and measurements read the shared lattice between sweeps
+        shared = sl.SharedLattice(config, beta, workers, seed, neighbours)
+        move = lambda config: shared.sweep()
+
+    ene_steps = []
+    mag_steps = []
     ene_count = 0.0
     mag_count = 0.0
-    
-    #Beta values, with Boltzmann constant k = 1
-    beta = 1.0/T[n_temp]
-    
-    #Equilibrate the system
-    for i in range(eq_steps):         
-        config = fi.metropolis_move(config, beta)  
-        
-        #Data for plots vs steps
-        if n_temp == nT_show:
-            a = fi.calculate_energy(config)
-            b = fi.calculate_magnetization(config)
-            y_ene.append(a)
-            y_mag.append(b)
-            
-            #Save data
-            if save_data == True:
-                fi.save_steps_data(a, b, ene_steps_path, mag_steps_path)
-
-    #Acquire energy and magnetization measurements
-    for i in range(mc_steps):
-        config = fi.metropolis_move(config, beta)          
-        ene_step = fi.calculate_energy(config)     
-        mag_step = fi.calculate_magnetization(config) 
-        
-        #Data for plots vs steps
-        if n_temp == nT_show:
-            c = fi.calculate_energy(config)
-            d = fi.calculate_magnetization(config)
-            y_ene.append(c)
-            y_mag.append(d)
-            
-            #Save data
-            if save_data == True:
-                fi.save_steps_data(c, d, ene_steps_path, mag_steps_path)
-
-        ene_count += ene_step
-        mag_count += mag_step
-
-    #Divide by number of steps and system size to get intensive values    
-    energy[n_temp] = norm_intensive*ene_count
-    magnetization[n_temp] = norm_intensive*mag_count
-    
-    #Save data
-    if save_data == True:
-        fi.save_temp_data(energy[n_temp], magnetization[n_temp], ene_temp_path, mag_temp_path)
-
-#Plotting quantities and saving them
-pi.plots_T(T, energy, magnetization, save_plots, temp_plots_path)
-pi.plots_steps(x_step, y_ene, y_mag, save_plots, steps_plots_path)
-
-#Showing lattice evolution and saving it
-evolution_states = fi.simulate(initial_state, beta_show, times)
-pi.plot_evolution(evolution_states, N, M, times, save_plots, evo_plots_path)
+    structure_count = np.zeros((N, M))
+
+    try:
+        #Equilibrate the system
+        for i in range(eq_steps):
+            config = move(config)
+
+            #Data for plots vs steps
+            if record_steps == True:
+                ene_steps.append(fi.calculate_energy(config, neighbours))
+                mag_steps.append(fi.calculate_magnetization(config))
+
+        #Acquire energy and magnetization measurements
+        for i in range(mc_steps):
+            config = move(config)
+            ene_step = fi.calculate_energy(config, neighbours)
+            mag_step = fi.calculate_magnetization(config)
+
+            #Data for plots vs steps
+            if record_steps == True:
+                ene_steps.append(ene_step)
+                mag_steps.append(mag_step)
+
+            ene_count += ene_step
+            mag_count += mag_step
+
+            #Structure factor accumulated step by step, only its mean is kept
+            if correlation == True:
+                structure_count += fi.structure_factor(config)
+    finally:
+        if engine == 'shared':
+            config = None
+            shared.close()
+
+    #Divide by number of steps and system size to get intensive values
+    norm_intensive = 1.0/(mc_steps*N*M)
+    point = {'T': T, 'energy': norm_intensive*ene_count, 'magnetization': norm_intensive*mag_count}
+
+    if record_steps == True:
+        point['ene_steps'] = ene_steps
+        point['mag_steps'] = mag_steps
+
+    if correlation == True:
+        structure = structure_count/mc_steps
+        point['structure_factor'] = structure.tolist()
+        point['correlation_length'] = float(fi.correlation_length(structure))
+
+    if cache_dir is not None:
+        cc.save_point(parameters, point, cache_dir, cache_size)
+
+    return point
+
+
+def _exact_point(N, M, T):
+    """
+    This function gives the exact averages at some temperatures, with the same
+    keys of run_temperature_point
+
+    Parameters
+    ----------
+    N : int
+        length of the lattice.
+    M : int
+        width of the lattice.
+    T : float or 1D-like array
+        temperature points.
+
+    Returns
+    -------
+        dictionary with 'T', 'energy', root mean square 'magnetization_rms', mean square
+        'magnetization2', 'specific_heat' and 'susceptibility', as floats if T is a float
+        and as arrays otherwise.
+
+    """
+
+    exact = tm.exact_observables(N, M, T)
+    point = {'T': T, 'energy': exact['energy'], 'magnetization_rms': np.sqrt(exact['magnetization2']),
+             'magnetization2': exact['magnetization2'], 'specific_heat': exact['specific_heat'],
+             'susceptibility': exact['susceptibility']}
+
+    if np.ndim(T) == 0:
+        point = {key: float(value[0]) if key != 'T' else value for key, value in point.items()}
+
+    return point
+
+
+def run_sweep(N, M, T, seed = 42, spin_up_pol = None, eq_steps = 1000, mc_steps = 1000, nT_show = None, progress = False, save_data = False, paths = None, cache_dir = None, cache_size = None, correlation = False, engine = 'metropolis', topology = 'square', periodic = True, workers = None):
+    """
+    This function simulates the lattice at every temperature point, always
+    starting from the same initial state
+
+    Parameters
+    ----------
+    N : int
+        length of the lattice.
+    M : int
+        width of the lattice.
+    T : 1D-like array
+        temperature points.
+    seed : int, optional
+        seed of the initial state and of the evolution. The default is 42.
+    spin_up_pol : float, optional
+        mean spin up polarization. The default is None, that will generate a random lattice.
+    eq_steps : int, optional
+        steps waited before starting the acquisition of observables. The default is 1000.
+    mc_steps : int, optional
+        steps used to calculate thermodinamical averages. The default is 1000.
+    nT_show : int, optional
+        index of the temperature at which energy and magnetization are stored at
+        every step. The default is None, that will not store them.
+    progress : bool, optional
+        if True, a progress bar is shown. The default is False.
+    save_data : bool, optional
+        if True, data is saved in the files given by paths. The default is False.
+    paths : dict, optional
+        save paths, with the same keys of DEFAULT_PATHS. The default is None, that will use DEFAULT_PATHS.
+    cache_dir : string, optional
+        directory of the cache of temperature points. The default is None, that will not use the cache.
+    cache_size : int, optional
+        maximum size of the cache in bytes. The default is None, that will never evict points.
+    correlation : bool, optional
+        if True, the structure factor and the correlation length are calculated. The default is False.
+    engine : string, optional
+        algorithm updating the lattice, one of ENGINES; with 'exact', all temperatures
+        are calculated at once and there is no data vs steps. The default is 'metropolis'.
+    topology : string, optional
+        lattice geometry, one of lattice_topology.KINDS. The default is 'square'.
+    periodic : bool, optional
+        if True, PBC are used, otherwise boundaries are open. The default is True.
+    workers : int, optional
+        number of worker processes of the shared engine. The default is None, that will use all the cores.
+
+    Returns
+    -------
+        dictionary with the temperature points 'T', the intensive mean 'energy' and
+        'magnetization' arrays and the lists 'ene_steps' and 'mag_steps' at nT_show;
+        if correlation is True, also the 'correlation_length' array and the mean
+        'structure_factor' at each temperature, with shape (len(T), N, M); if engine
+        is 'exact', 'magnetization' is replaced by the 'magnetization_rms' and
+        'magnetization2' arrays, and there are also the 'specific_heat' and
+        'susceptibility' arrays.
+
+    Raises
+    ------
+        ValueError if nT_show is out of the temperature range, or if both lattice
+        dimensions are too large for the exact engine.
+
+    """
+
+    T = np.asarray(T, dtype = float)
+    numb_T = len(T)
+
+    if nT_show is not None and not 0 <= nT_show <= numb_T - 1:
+        raise ValueError('The temperature index to show must hold 0 <= nT_show <= {0}, but is {1}\n'.format(numb_T - 1, nT_show))
+
+    if paths is None:
+        paths = DEFAULT_PATHS
+
+    #All temperatures in a single call
+    if engine == 'exact':
+        if topology != 'square' or periodic != True:
+            raise ValueError('The exact engine is only available for the square lattice with PBC\n')
+        if correlation == True:
+            raise ValueError('Correlation is not available with the exact engine\n')
+        tm.check_width(N, M)
+        if nT_show is not None:
+            logging.info('There is no data vs steps with the exact engine\n')
+
+        results = _exact_point(N, M, T)
+        results['ene_steps'] = []
+        results['mag_steps'] = []
+
+        if save_data == True:
+            for n_temp in range(numb_T):
+                fi.save_temp_data(results['energy'][n_temp], results['magnetization_rms'][n_temp], paths['ene_temp_path'], paths['mag_rms_temp_path'])
+
+        return results
+
+    energy = np.zeros(numb_T)
+    magnetization = np.zeros(numb_T)
+    ene_steps = []
+    mag_steps = []
+    if correlation == True:
+        correlation_lengths = np.zeros(numb_T)
+        structures = np.zeros((numb_T, N, M))
+
+    #The progress bar is only imported when requested
+    temperatures = range(numb_T)
+    if progress == True:
+        from tqdm import tqdm
+        temperatures = tqdm(temperatures, desc = 'Loop over temperature values', position = 0)
+
+    for n_temp in temperatures:
+        record_steps = n_temp == nT_show
+        point = run_temperature_point(N, M, T[n_temp], seed, spin_up_pol, eq_steps, mc_steps, record_steps, correlation, cache_dir, cache_size, engine, topology, periodic, workers)
+
+        energy[n_temp] = point['energy']
+        magnetization[n_temp] = point['magnetization']
+
+        if correlation == True:
+            correlation_lengths[n_temp] = point['correlation_length']
+            structures[n_temp] = point['structure_factor']
+
+        if record_steps:
+            ene_steps = point['ene_steps']
+            mag_steps = point['mag_steps']
+
+        #Save data
+        if save_data == True:
+            if record_steps:
+                for a, b in zip(ene_steps, mag_steps):
+                    fi.save_steps_data(a, b, paths['ene_steps_path'], paths['mag_steps_path'])
+            fi.save_temp_data(energy[n_temp], magnetization[n_temp], paths['ene_temp_path'], paths['mag_temp_path'])
+
+    results = {'T': T, 'energy': energy, 'magnetization': magnetization, 'ene_steps': ene_steps, 'mag_steps': mag_steps}
+
+    if correlation == True:
+        results['correlation_length'] = correlation_lengths
+        results['structure_factor'] = structures
+
+    return results
+
+
+def read_cache_configuration(configuration):
+    """
+    This function reads the cache options from the CACHE section of a
+    configuration file; configuration files without it do not use the cache
+
+    Parameters
+    ----------
+    configuration : configparser
+        configuration to be read.
+
+    Returns
+    -------
+        the cache directory, or None if the cache is not used, and its maximum size in bytes.
+
+    """
+
+    if not configuration.getboolean('CACHE', 'use_cache', fallback = False):
+        return None, None
+
+    cache_dir = configuration.get('CACHE', 'cache_dir', fallback = 'ising_cache')
+    cache_size = int(configuration.getfloat('CACHE', 'cache_size', fallback = 100)*2**20)
+
+    return cache_dir, cache_size
+
+
+class Simulation:
+    """
+    This class collects the parameters of a temperature sweep, so that it can be
+    run and plotted programmatically or from the command line
+
+    Parameters
+    ----------
+    N : int
+        length of the lattice.
+    M : int
+        width of the lattice.
+    T : 1D-like array
+        temperature points.
+    seed : int, optional
+        seed of the initial state and of the evolution. The default is 42.
+    spin_up_pol : float, optional
+        mean spin up polarization. The default is None, that will generate a random lattice.
+    eq_steps : int, optional
+        steps waited before starting the acquisition of observables. The default is 1000.
+    mc_steps : int, optional
+        steps used to calculate thermodinamical averages. The default is 1000.
+    nT_show : int, optional
+        index of the temperature at which steps data and evolution are shown. The default is 0.
+    times : 1D-like array, optional
+        five time instants when to show the lattice. The default is (5, 10, 50, 100, 1000).
+    save_data : bool, optional
+        if True, data is saved. The default is False.
+    save_plots : bool, optional
+        if True, plots are saved. The default is True.
+    paths : dict, optional
+        save paths, with the same keys of DEFAULT_PATHS. The default is None, that will use DEFAULT_PATHS.
+    cache_dir : string, optional
+        directory of the cache of temperature points. The default is None, that will not use the cache.
+    cache_size : int, optional
+        maximum size of the cache in bytes. The default is None, that will never evict points.
+    correlation : bool, optional
+        if True, the structure factor and the correlation length are calculated. The default is False.
+    engine : string, optional
+        algorithm updating the lattice, one of ENGINES. The default is 'metropolis'.
+    topology : string, optional
+        lattice geometry, one of lattice_topology.KINDS. The default is 'square'.
+    periodic : bool, optional
+        if True, PBC are used, otherwise boundaries are open. The default is True.
+    workers : int, optional
+        number of worker processes of the shared engine. The default is None, that will use all the cores.
+
+    """
+
+    def __init__(self, N, M, T, seed = 42, spin_up_pol = None, eq_steps = 1000, mc_steps = 1000, nT_show = 0, times = (5, 10, 50, 100, 1000), save_data = False, save_plots = True, paths = None, cache_dir = None, cache_size = None, correlation = False, engine = 'metropolis', topology = 'square', periodic = True, workers = None):
+        self.N = N
+        self.M = M
+        self.T = np.asarray(T, dtype = float)
+        self.seed = seed
+        self.spin_up_pol = spin_up_pol
+        self.eq_steps = eq_steps
+        self.mc_steps = mc_steps
+        self.nT_show = nT_show
+        self.times = tuple(times)
+        self.save_data = save_data
+        self.save_plots = save_plots
+        self.paths = dict(DEFAULT_PATHS)
+        if paths is not None:
+            self.paths.update(paths)
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.correlation = correlation
+        self.engine = engine
+        self.topology = topology
+        self.periodic = periodic
+        self.workers = workers
+
+    @classmethod
+    def from_configuration(cls, configuration):
+        """
+        This function builds the simulation from a configuration file read by
+        functions_ising.read_configuration
+
+        Parameters
+        ----------
+        configuration : configparser
+            configuration with the same sections of CONFIGURATION.ini.
+
+        Returns
+        -------
+            the Simulation with the parameters of the configuration.
+
+        """
+
+        #The spin up polarization can be None, as stated in the configuration file
+        spin_up_pol = configuration.get('SETTINGS', 'spin_up_pol')
+        spin_up_pol = None if spin_up_pol == 'None' else float(spin_up_pol)
+
+        #Also the number of workers of the shared engine, that is optional
+        workers = configuration.get('SETTINGS', 'workers', fallback = 'None')
+        workers = None if workers == 'None' else int(workers)
+
+        T = np.linspace(configuration.getfloat('SETTINGS', 'T_init'), configuration.getfloat('SETTINGS', 'T_final'), configuration.getint('SETTINGS', 'numb_T'))
+        times = tuple(configuration.getint('PLOTTING', 't{0}'.format(i)) for i in range(1, 6))
+        paths = {key: configuration.get('PATHS', key, fallback = DEFAULT_PATHS[key]) for key in DEFAULT_PATHS}
+        cache_dir, cache_size = read_cache_configuration(configuration)
+
+        return cls(configuration.getint('SETTINGS', 'N'), configuration.getint('SETTINGS', 'M'), T,
+                   seed = configuration.getint('SETTINGS', 'seed'),
+                   spin_up_pol = spin_up_pol,
+                   eq_steps = configuration.getint('SETTINGS', 'eq_steps'),
+                   mc_steps = configuration.getint('SETTINGS', 'mc_steps'),
+                   nT_show = configuration.getint('PLOTTING', 'nT_show'),
+                   times = times,
+                   save_data = configuration.getboolean('PATHS', 'save_data'),
+                   save_plots = configuration.getboolean('PATHS', 'save_plots'),
+                   paths = paths,
+                   cache_dir = cache_dir,
+                   cache_size = cache_size,
+                   correlation = configuration.getboolean('SETTINGS', 'correlation', fallback = False),
+                   engine = configuration.get('SETTINGS', 'engine', fallback = 'metropolis'),
+                   topology = configuration.get('SETTINGS', 'topology', fallback = 'square'),
+                   periodic = configuration.getboolean('SETTINGS', 'periodic', fallback = True),
+                   workers = workers)
+
+    def run(self, progress = False):
+        """
+        This function runs the temperature sweep with run_sweep
+
+        Parameters
+        ----------
+        progress : bool, optional
+            if True, a progress bar is shown. The default is False.
+
+        Returns
+        -------
+            the results of run_sweep.
+
+        """
+
+        return run_sweep(self.N, self.M, self.T, self.seed, self.spin_up_pol, self.eq_steps, self.mc_steps, self.nT_show, progress, self.save_data, self.paths, self.cache_dir, self.cache_size, self.correlation, self.engine, self.topology, self.periodic, self.workers)
+
+    def evolution(self):
+        """
+        This function simulates the lattice evolution at the temperature nT_show,
+        from the same initial state of the sweep
+
+        Returns
+        -------
+            array containing the initial lattice spin configuration and the evolved ones.
+
+        """
+
+        initial_state = fi.initialize_state(self.N, self.M, self.spin_up_pol, self.seed)
+
+        return fi.simulate(initial_state, 1.0/self.T[self.nT_show], self.times, lt.get_topology(self.N, self.M, self.topology, self.periodic))
+
+    def animate(self, save_path = 'evolution.gif', steps = None, every = 1, fps = 20, scale = 1, store = None):
+        """
+        This function renders the lattice evolution at the temperature nT_show to a
+        GIF or a video, streaming the frames while the run goes on, or from a
+        snapshot store
+
+        Parameters
+        ----------
+        save_path : string, optional
+            path of the animation, a .gif or a video (e.g. .mp4, with ffmpeg). The default is 'evolution.gif'.
+        steps : int, optional
+            number of steps of the run. The default is None, that will use the last of times.
+        every : int, optional
+            number of steps between frames. The default is 1.
+        fps : int, optional
+            frames per second. The default is 20.
+        scale : int, optional
+            pixels per lattice site along each direction. The default is 1.
+        store : string, optional
+            path of a snapshot store written by animation_ising.save_snapshots, whose
+            frames are rendered instead of running. The default is None.
+
+        Returns
+        -------
+            number of frames written.
+
+        """
+
+        import animation_ising as an
+
+        if store is not None:
+            frames = an.load_snapshots(store)
+        else:
+            if steps is None:
+                steps = max(self.times)
+            initial_state = fi.initialize_state(self.N, self.M, self.spin_up_pol, self.seed)
+            frames = an.run_frames(initial_state, 1.0/self.T[self.nT_show], steps, every, lt.get_topology(self.N, self.M, self.topology, self.periodic))
+
+        return an.render_animation(frames, save_path, fps, scale)
+
+    def plot(self, results, evolution = True):
+        """
+        This function plots the results of a sweep; matplotlib is only imported here
+
+        Parameters
+        ----------
+        results : dict
+            results of run_sweep.
+        evolution : bool, optional
+            if True, the lattice evolution is also simulated and shown. The default is True.
+
+        Returns
+        -------
+            None.
+
+        """
+
+        import plots_ising as pi
+
+        x_step = range(len(results['ene_steps']))
+
+        #Plotting quantities and saving them
+        #The exact engine gives the root mean square magnetization, the mean being zero
+        if 'magnetization_rms' in results:
+            pi.plots_T(results['T'], results['energy'], results['magnetization_rms'], self.save_plots, self.paths['temp_plots_path'], mag_label = 'RMS magnetization')
+        else:
+            pi.plots_T(results['T'], results['energy'], results['magnetization'], self.save_plots, self.paths['temp_plots_path'])
+        pi.plots_steps(x_step, results['ene_steps'], results['mag_steps'], self.save_plots, self.paths['steps_plots_path'])
+
+        #Showing lattice evolution and saving it
+        if evolution == True:
+            pi.plot_evolution(self.evolution(), self.N, self.M, self.times, self.save_plots, self.paths['evo_plots_path'])
+
+
+def bench(N = 30, M = 30, sweeps = 10, T = 2.5, seed = 42, workers = None):
+    """
+    This function measures the time spent in the Metropolis update and in the
+    energy calculation, and optionally in the update of a lattice split into
+    strips updated by parallel processes
+
+    Parameters
+    ----------
+    N : int, optional
+        length of the lattice. The default is 30.
+    M : int, optional
+        width of the lattice. The default is 30.
+    sweeps : int, optional
+        number of lattice sweeps to be timed. The default is 10.
+    T : float, optional
+        temperature of the sweeps. The default is 2.5.
+    seed : int, optional
+        seed of the initial state. The default is 42.
+    workers : int, optional
+        number of processes updating the shared lattice. The default is None, that
+        will not time it.
+
+    Returns
+    -------
+        dictionary with the seconds per sweep of 'metropolis_move' and 'calculate_energy',
+        and of 'shared_lattice' if workers is given.
+
+    """
+
+    lattice = fi.initialize_state(N, M, seed = seed)
+    beta = 1.0/T
+
+    start = time.perf_counter()
+    for i in range(sweeps):
+        lattice = fi.metropolis_move(lattice, beta)
+    move_time = (time.perf_counter() - start)/sweeps
+
+    start = time.perf_counter()
+    for i in range(sweeps):
+        fi.calculate_energy(lattice)
+    energy_time = (time.perf_counter() - start)/sweeps
+
+    timings = {'metropolis_move': move_time, 'calculate_energy': energy_time}
+
+    if workers is not None:
+        #Workers are started before timing
+        with sl.SharedLattice(lattice, beta, workers, seed) as shared:
+            start = time.perf_counter()
+            shared.sweep(sweeps)
+            timings['shared_lattice'] = (time.perf_counter() - start)/sweeps
+
+    return timings
+
+
+def main(argv = None):
+    """
+    This function is the command line entry point, with the subcommands 'run',
+    'plot', 'animate', 'campaign', 'coordinator', 'worker', 'cache' and 'bench'; a configuration file alone is also accepted, as in
+    'python simulation.py CONFIGURATION.ini', and is run
+
+    Parameters
+    ----------
+    argv : 1D-like array, optional
+        command line arguments. The default is None, that will use sys.argv.
+
+    Returns
+    -------
+        exit status.
+
+    """
+
+    parser = argparse.ArgumentParser(description = 'Monte Carlo simulation of the 2D Ising model')
+    subparsers = parser.add_subparsers(dest = 'command')
+
+    run_parser = subparsers.add_parser('run', help = 'run the temperature sweep and plot it')
+    run_parser.add_argument('configuration', nargs = '?', default = 'CONFIGURATION.ini')
+    run_parser.add_argument('--no-plot', action = 'store_true', help = 'do not plot, so matplotlib is never imported')
+    run_parser.add_argument('--no-progress', action = 'store_true', help = 'do not show the progress bar')
+
+    plot_parser = subparsers.add_parser('plot', help = 'plot previously saved data')
+    plot_parser.add_argument('configuration', nargs = '?', default = 'CONFIGURATION.ini')
+
+    animate_parser = subparsers.add_parser('animate', help = 'render the lattice evolution to a GIF or a video')
+    animate_parser.add_argument('configuration', nargs = '?', default = 'CONFIGURATION.ini')
+    animate_parser.add_argument('--output', default = 'evolution.gif', help = 'path of the animation, .gif or a video format of ffmpeg (e.g. .mp4)')
+    animate_parser.add_argument('--steps', type = int, help = 'steps of the run, the last time instant of the configuration by default')
+    animate_parser.add_argument('--every', type = int, default = 1, help = 'steps between frames')
+    animate_parser.add_argument('--fps', type = int, default = 20, help = 'frames per second')
+    animate_parser.add_argument('--scale', type = int, default = 1, help = 'pixels per lattice site')
+    animate_parser.add_argument('--store', help = 'render the frames of this snapshot store instead of running')
+
+    campaign_parser = subparsers.add_parser('campaign', help = 'run a campaign of lattice sizes, temperatures and seeds')
+    campaign_parser.add_argument('configuration', nargs = '?', default = 'CAMPAIGN.ini')
+    campaign_parser.add_argument('--no-progress', action = 'store_true', help = 'do not show the progress bar')
+
+    coordinator_parser = subparsers.add_parser('coordinator', help = 'serve the tasks of a campaign to workers on this or other hosts')
+    coordinator_parser.add_argument('configuration', nargs = '?', default = 'CAMPAIGN.ini')
+    coordinator_parser.add_argument('--address', default = ':50000', help = 'host:port where workers connect, all interfaces if the host is empty')
+    coordinator_parser.add_argument('--authkey', required = True, help = 'key shared with the workers')
+    coordinator_parser.add_argument('--local-workers', type = int, default = 0, help = 'number of workers started on this host')
+    coordinator_parser.add_argument('--max-retries', type = int, default = 3, help = 'failures after which a task is given up')
+    coordinator_parser.add_argument('--lease-timeout', type = float, default = 60, help = 'seconds without heartbeats after which a task not given back is put back in the queue')
+
+    worker_parser = subparsers.add_parser('worker', help = 'run the tasks of a coordinator')
+    worker_parser.add_argument('--address', required = True, help = 'host:port of the coordinator')
+    worker_parser.add_argument('--authkey', required = True, help = 'key shared with the coordinator')
+    worker_parser.add_argument('--cache-dir', help = 'local cache of temperature points of this worker')
+    worker_parser.add_argument('--heartbeat-interval', type = float, default = 10, help = 'seconds between the heartbeats renewing the lease of the running task')
+
+    cache_parser = subparsers.add_parser('cache', help = 'describe or invalidate the cache of temperature points')
+    cache_parser.add_argument('action', choices = ('info', 'clear'))
+    cache_parser.add_argument('configuration', nargs = '?', default = 'CONFIGURATION.ini')
+    cache_parser.add_argument('--dir', help = 'cache directory, instead of the one in the configuration file')
+    for name, kind in (('N', int), ('M', int), ('T', float), ('seed', int)):
+        cache_parser.add_argument('--{0}'.format(name), type = kind, help = 'only clear the points with this {0}'.format(name))
+
+    bench_parser = subparsers.add_parser('bench', help = 'time the lattice update')
+    bench_parser.add_argument('--N', type = int, default = 30)
+    bench_parser.add_argument('--M', type = int, default = 30)
+    bench_parser.add_argument('--sweeps', type = int, default = 10)
+    bench_parser.add_argument('--T', type = float, default = 2.5)
+    bench_parser.add_argument('--workers', type = int, help = 'also time the shared lattice updated by this number of processes')
+
+    if argv is None:
+        argv = sys.argv[1:]
+    argv = list(argv)
+
+    #A configuration file alone (or nothing) means run
+    if len(argv) == 0 or argv[0] not in subparsers.choices and not argv[0].startswith('-'):
+        argv = ['run'] + argv
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        timings = bench(args.N, args.M, args.sweeps, args.T, workers = args.workers)
+        for name, seconds in timings.items():
+            print('{0}: {1:.6f} s/sweep, {2:.3e} sites/s'.format(name, seconds, args.N*args.M/seconds))
+        return 0
+
+    if args.command == 'worker':
+        import distributed as di
+
+        options = {} if args.cache_dir is None else {'cache_dir': args.cache_dir}
+        di.run_worker(di.parse_address(args.address), args.authkey.encode(), heartbeat_interval = args.heartbeat_interval, **options)
+        return 0
+
+    if args.command == 'cache':
+        cache_dir = args.dir
+        if cache_dir is None:
+            cache_dir = fi.read_configuration(args.configuration).get('CACHE', 'cache_dir', fallback = 'ising_cache')
+
+        if args.action == 'clear':
+            match = {name: getattr(args, name) for name in ('N', 'M', 'T', 'seed') if getattr(args, name) is not None}
+            print('Removed {0} points from {1}'.format(cc.invalidate_cache(cache_dir, **match), cache_dir))
+        else:
+            points, size = cc.cache_info(cache_dir)
+            print('{0}: {1} points, {2:.3f} MB'.format(cache_dir, points, size/2**20))
+        return 0
+
+    configuration = fi.read_configuration(args.configuration)
+
+    #Logging
+    logging.basicConfig(level = configuration.getint('LOGGING', 'level'))
+
+    if args.command == 'campaign':
+        import campaign as ca
+
+        parameters = ca.read_campaign(configuration)
+        tasks = ca.expand_tasks(parameters['sizes'], parameters['T_ranges'], parameters['seeds'])
+        store = ca.run_campaign(tasks, parameters['spin_up_pol'], parameters['eq_steps'], parameters['mc_steps'], parameters['processes'], not args.no_progress, parameters['cache_dir'], parameters['cache_size'], parameters['engine'])
+        ca.save_campaign(store, parameters['store_path'])
+        return 0
+
+    if args.command == 'coordinator':
+        import campaign as ca
+        import distributed as di
+
+        parameters = ca.read_campaign(configuration)
+        tasks = ca.expand_tasks(parameters['sizes'], parameters['T_ranges'], parameters['seeds'])
+        store = di.run_distributed(tasks, parameters['spin_up_pol'], parameters['eq_steps'], parameters['mc_steps'],
+                                   di.parse_address(args.address), args.authkey.encode(), args.local_workers, args.max_retries, args.lease_timeout,
+                                   engine = parameters['engine'], cache_dir = parameters['cache_dir'], cache_size = parameters['cache_size'])
+        ca.save_campaign(store, parameters['store_path'])
+        return 0
+
+    simulation = Simulation.from_configuration(configuration)
+
+    if args.command == 'animate':
+        simulation.animate(args.output, args.steps, args.every, args.fps, args.scale, args.store)
+        return 0
+
+    if args.command == 'plot':
+        results = {'T': simulation.T,
+                   'energy': np.loadtxt(configuration.get('PLOTTING', 'load_ene_temp_plots')),
+                   'magnetization': np.loadtxt(configuration.get('PLOTTING', 'load_mag_temp_plots')),
+                   'ene_steps': np.loadtxt(configuration.get('PLOTTING', 'load_ene_steps_plots')),
+                   'mag_steps': np.loadtxt(configuration.get('PLOTTING', 'load_mag_steps_plots'))}
+
+        #The lattice representation cannot be loaded
+        simulation.plot(results, evolution = False)
+        return 0
+
+    results = simulation.run(progress = not args.no_progress)
+
+    if not args.no_plot:
+        simulation.plot(results)
+
+    return 0
+
 
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,8 +7,25 @@ Created on Fri Dec 17 14:59:01 2021
 
 
 import functions_ising as fi
+import simulation as sim
+import campaign as ca
+import cache_ising as cc
+import distributed as di
+import shared_lattice as sl
+import nfold_way as nw
+import transfer_matrix as tm
+import lattice_topology as lt
+import animation_ising as an
+import itertools
+import multiprocessing
 import numpy as np
 import pytest
+import os
+import subprocess
+import sys
+import time
+import pickle
+import configparser
 
 
 #Test the lattice initialization function
@@ -182,6 +199,133 @@ def test_mag(N = 2, M = 3, seed = 2):
     assert mag == calculated_mag
     
 
+#Test the functions that calculate the correlation by FFT
+def test_correlation_real_space(N = 4, M = 5, seed = 7):
+    """
+    Test that the correlation function calculated by FFT is the same as the 
+    one calculated in real space, considering PBC.
+
+    """
+    
+    lattice = fi.initialize_state(N, M, seed = seed)
+    correlation = fi.correlation_function(fi.structure_factor(lattice))
+    for rx in range(N):
+        for ry in range(M):
+            calculated_correlation = 0.0
+            for x in range(N):
+                for y in range(M):
+                    calculated_correlation += lattice[x, y]*lattice[(x+rx)%N, (y+ry)%M]
+            assert np.isclose(correlation[rx, ry], calculated_correlation/(N*M))
+
+
+def test_structure_factor_zero(N = 4, M = 5, seed = 7):
+    """
+    Test that the structure factor at k = 0 is the squared magnetization 
+    divided by the number of sites.
+
+    """
+    
+    lattice = fi.initialize_state(N, M, seed = seed)
+    structure = fi.structure_factor(lattice)
+    assert np.isclose(structure[0, 0], fi.calculate_magnetization(lattice)**2/(N*M))
+
+
+def test_correlation_length_ordered(N = 4, M = 4, spin_up_pol = 1):
+    """
+    Test that the correlation length of a fully polarized lattice is infinite.
+
+    """
+    
+    lattice = fi.initialize_state(N, M, spin_up_pol)
+    assert fi.correlation_length(fi.structure_factor(lattice)) == np.inf
+
+
+def test_correlation_length_raises_error(N = 1, M = 1):
+    """
+    Test that an error is raised if the correlation length of a single point 
+    lattice is calculated.
+
+    """
+    
+    lattice = fi.initialize_state(N, M)
+    with pytest.raises(ValueError):
+        length = fi.correlation_length(fi.structure_factor(lattice))
+
+
+#Test the functions that analyse the domains
+def test_domains_flood_fill(N = 6, M = 7, seed = 9):
+    """
+    Test that the domains are the same as found by a flood fill of equal 
+    nearest neighbours, considering PBC.
+
+    """
+    
+    lattice = fi.initialize_state(N, M, seed = seed)
+    labels = fi.label_domains(lattice)
+    visited = np.zeros((N, M), dtype = bool)
+    numb_domains = 0
+    for x in range(N):
+        for y in range(M):
+            if visited[x, y]:
+                continue
+            numb_domains += 1
+            domain = [(x, y)]
+            visited[x, y] = True
+            for i, j in domain:
+                assert labels[i, j] == labels[x, y]
+                for k, l in ((i+1)%N, j), ((i-1)%N, j), (i, (j+1)%M), (i, (j-1)%M):
+                    if not visited[k, l] and lattice[k, l] == lattice[i, j]:
+                        visited[k, l] = True
+                        domain.append((k, l))
+    assert len(np.unique(labels)) == numb_domains
+
+
+def test_domains_polarized(N = 4, M = 5, spin_up_pol = 1):
+    """
+    Test that a fully polarized lattice is a single domain with no walls.
+
+    """
+    
+    lattice = fi.initialize_state(N, M, spin_up_pol)
+    statistics = fi.domain_statistics(lattice)
+    assert statistics['numb_domains'] == 1
+    assert statistics['largest_fraction'] == 1
+    assert statistics['wall_length'] == 0
+
+
+def test_domains_checkerboard(N = 4, M = 6):
+    """
+    Test that in a checkerboard lattice every site is a domain, and every 
+    bond is a wall.
+
+    """
+    
+    x, y = np.meshgrid(range(N), range(M), indexing = 'ij')
+    lattice = np.where((x + y)%2 == 0, 1., -1.)
+    statistics = fi.domain_statistics(lattice)
+    assert statistics['numb_domains'] == N*M
+    assert statistics['wall_length'] == 2*N*M
+    assert statistics['size_histogram'][1] == N*M
+
+
+def test_domains_stack(N = 5, M = 5, beta = 1.0, times = [1, 2, 3, 4, 5]):
+    """
+    Test that the statistics of a stack of lattices are the same as the 
+    ones of each lattice.
+
+    """
+    
+    lattice = fi.initialize_state(N, M)
+    states = fi.simulate(lattice, beta, times)
+    statistics = fi.domain_statistics(states)
+    for t, state in enumerate(states):
+        single_statistics = fi.domain_statistics(state)
+        assert statistics['numb_domains'][t] == single_statistics['numb_domains']
+        assert statistics['largest_fraction'][t] == single_statistics['largest_fraction']
+        assert statistics['wall_length'][t] == single_statistics['wall_length']
+        assert np.array_equal(statistics['size_histogram'][t], single_statistics['size_histogram'])
+
+
 #Test the function that reads the configuration parameters
 def test_read_configuration(filename = ''):
     """
@@ -221,14 +365,823 @@ def test_simulate_times_independent(N = 2, M = 3, seed = 3, beta = 1.0, times1 =
     assert np.array_equal(evolved_states1[5], evolved_states2[5]) == True
 
 
+#Test the importable simulation interface
+def test_import_is_lightweight():
+    """
+    Test that importing the simulation module runs nothing and does not import
+    matplotlib or tqdm.
+
+    """
+    
+    code = 'import simulation, sys; print("matplotlib" in sys.modules or "tqdm" in sys.modules)'
+    output = subprocess.run([sys.executable, '-c', code], capture_output = True, text = True, check = True)
+    assert output.stdout.strip() == 'False'
+
+
+def test_temperature_point_reproducible(N = 3, M = 4, T = 2.0, seed = 5):
+    """
+    Test that a temperature point only depends on its arguments, and that the 
+    intensive values are within their physical bounds.
+
+    """
+    
+    point1 = sim.run_temperature_point(N, M, T, seed, eq_steps = 3, mc_steps = 4)
+    point2 = sim.run_temperature_point(N, M, T, seed, eq_steps = 3, mc_steps = 4)
+    assert point1 == point2
+    assert -2 <= point1['energy'] <= 2
+    assert -1 <= point1['magnetization'] <= 1
+
+
+def test_sweep_steps_length(N = 2, M = 3, T = (1.0, 2.0, 3.0), eq_steps = 3, mc_steps = 4):
+    """
+    Test that the sweep returns a value for each temperature, and the data vs 
+    steps only at the chosen temperature.
+
+    """
+    
+    results = sim.run_sweep(N, M, T, eq_steps = eq_steps, mc_steps = mc_steps, nT_show = 1)
+    assert len(results['energy']) == len(T)
+    assert len(results['magnetization']) == len(T)
+    assert len(results['ene_steps']) == eq_steps + mc_steps
+    
+    
+def test_sweep_raises_error_nT_show(N = 2, M = 3, T = (1.0, 2.0)):
+    """
+    Test that an error is raised if the temperature index to show is out of range.
+
+    """
+    
+    with pytest.raises(ValueError):
+        results = sim.run_sweep(N, M, T, eq_steps = 1, mc_steps = 1, nT_show = 2)
+
+
+#Test the campaign of lattice sizes, temperatures and seeds
+def test_expand_tasks_largest_first(sizes = (4, 16, 8), T = (1.0, 2.0), seeds = (1, 2, 3)):
+    """
+    Test that every (size, T, seed) combination becomes a task, and that the 
+    largest lattices come first.
+
+    """
+    
+    tasks = ca.expand_tasks(sizes, T, seeds)
+    assert len(tasks) == len(sizes)*len(T)*len(seeds)
+    areas = [task[0]*task[1] for task in tasks]
+    assert areas == sorted(areas, reverse = True)
+
+
+def test_expand_tasks_raises_error_ranges(sizes = (4, 8, 16), T_ranges = ((1.0, 2.0), (1.5, 2.5)), seeds = (1,)):
+    """
+    Test that an error is raised if there are temperature ranges for only some sizes.
+
+    """
+    
+    with pytest.raises(ValueError):
+        tasks = ca.expand_tasks(sizes, T_ranges, seeds)
+
+
+def test_campaign_equal_to_points(tmp_path, sizes = (2, 3), T = (1.5, 3.0), seeds = (4,)):
+    """
+    Test that the campaign, run on a process pool, gives the same results as 
+    the single temperature points, and that they are saved in a single store.
+
+    """
+    
+    tasks = ca.expand_tasks(sizes, T, seeds)
+    store = ca.run_campaign(tasks, eq_steps = 2, mc_steps = 3, processes = 2)
+    assert len(store) == len(tasks)
+    for N, M, T_point, seed, energy, magnetization, magnetization_rms in store:
+        point = sim.run_temperature_point(int(N), int(M), T_point, int(seed), eq_steps = 2, mc_steps = 3)
+        assert energy == point['energy']
+        assert magnetization == point['magnetization']
+        assert np.isnan(magnetization_rms)
+    
+    path = tmp_path / 'campaign.txt'
+    ca.save_campaign(store, path)
+    assert np.array_equal(ca.load_campaign(path), store, equal_nan = True)
+
+
+#Test the cache of temperature points
+def test_cached_point_equal(tmp_path, N = 3, M = 3, T = 2.0, seed = 6):
+    """
+    Test that a point loaded from the cache is the same as the simulated one, 
+    and that a different parameter is not loaded.
+
+    """
+    
+    point = sim.run_temperature_point(N, M, T, seed, eq_steps = 2, mc_steps = 3, cache_dir = tmp_path)
+    parameters = {'N': N, 'M': M, 'T': T, 'seed': seed, 'spin_up_pol': None, 'eq_steps': 2, 'mc_steps': 3, 'engine': 'metropolis', 'engine_version': sim.ENGINE_VERSION, 'topology': 'square', 'periodic': True}
+    assert cc.load_point(parameters, tmp_path) == point
+    assert sim.run_temperature_point(N, M, T, seed, eq_steps = 2, mc_steps = 3, cache_dir = tmp_path) == point
+    parameters['mc_steps'] = 4
+    assert cc.load_point(parameters, tmp_path) is None
+
+
+def test_cache_key_numpy_types(N = 3, T = 2.0):
+    """
+    Test that numpy scalars and python numbers with the same value have the same key.
+
+    """
+    
+    assert cc.point_key({'N': np.int64(N), 'T': np.float64(T)}) == cc.point_key({'N': N, 'T': T})
+
+
+def test_cache_lru_eviction(tmp_path):
+    """
+    Test that the least recently used points are removed first when the cache
+    exceeds its size.
+
+    """
+    
+    for seed in range(3):
+        cc.save_point({'seed': seed}, {'energy': 0.0}, tmp_path)
+    points, size = cc.cache_info(tmp_path)
+    
+    #Make the first point the least recently used one, then use it
+    for seed in range(3):
+        path = tmp_path / (cc.point_key({'seed': seed}) + '.json')
+        os.utime(path, ns = (seed, seed))
+    assert cc.load_point({'seed': 0}, tmp_path) is not None
+    
+    cc.evict(tmp_path, size - 1)
+    assert cc.load_point({'seed': 0}, tmp_path) is not None
+    assert cc.load_point({'seed': 1}, tmp_path) is None
+    assert cc.load_point({'seed': 2}, tmp_path) is not None
+
+
+def test_invalidate_cache(tmp_path):
+    """
+    Test that only the points with the given parameters are invalidated, and 
+    that all of them are without parameters.
+
+    """
+    
+    for N in (2, 3, 3):
+        cc.save_point({'N': N, 'seed': len(os.listdir(tmp_path))}, {'energy': 0.0}, tmp_path)
+    assert cc.invalidate_cache(tmp_path, N = 3) == 2
+    assert cc.cache_info(tmp_path)[0] == 1
+    assert cc.invalidate_cache(tmp_path) == 1
+    assert cc.cache_info(tmp_path)[0] == 0
+
+
+def test_point_correlation_unchanged(tmp_path, N = 3, M = 4, T = 2.0, seed = 6):
+    """
+    Test that calculating the correlation does not change energy and 
+    magnetization, and that a cached point without it is not loaded.
+
+    """
+    
+    point = sim.run_temperature_point(N, M, T, seed, eq_steps = 2, mc_steps = 3, cache_dir = tmp_path)
+    correlated_point = sim.run_temperature_point(N, M, T, seed, eq_steps = 2, mc_steps = 3, correlation = True, cache_dir = tmp_path)
+    assert correlated_point['energy'] == point['energy']
+    assert correlated_point['magnetization'] == point['magnetization']
+    assert np.shape(correlated_point['structure_factor']) == (N, M)
+    assert correlated_point['correlation_length'] >= 0
+
+
+#Test the distribution of tasks to workers
+def test_distributed_equal_to_points(sizes = (2, 3), T = (1.5, 3.0), seeds = (4, 5)):
+    """
+    Test that the tasks run by local workers through the coordinator give the
+    same results as the single temperature points.
+
+    """
+    
+    tasks = ca.expand_tasks(sizes, T, seeds)
+    store = di.run_distributed(tasks, eq_steps = 2, mc_steps = 3, address = ('127.0.0.1', 0), local_workers = 2, poll_interval = 0.05)
+    assert len(store) == len(tasks)
+    assert np.array_equal(store, ca.run_campaign(tasks, eq_steps = 2, mc_steps = 3, processes = 1), equal_nan = True)
+
+
+def test_distributed_local_workers_cache(tmp_path, sizes = (2, 3), T = (1.5, 3.0), seeds = (4,)):
+    """
+    Test that the local workers of the coordinator save their points in the 
+    cache, when it is given.
+
+    """
+    
+    tasks = ca.expand_tasks(sizes, T, seeds)
+    store = di.run_distributed(tasks, eq_steps = 2, mc_steps = 3, address = ('127.0.0.1', 0), local_workers = 1, poll_interval = 0.05, cache_dir = str(tmp_path))
+    assert cc.cache_info(str(tmp_path))[0] == len(tasks)
+
+def test_failed_task_requeued(max_retries = 2):
+    """
+    Test that a failed task is put back in the queue, and given up after 
+    max_retries failures.
+
+    """
+    
+    board = di.TaskBoard([{'seed': 1}], max_retries)
+    status, task_id, task, lease = board.get_task()
+    board.put_failure(task_id, lease, 'error')
+    status, task_id, task, lease = board.get_task()
+    assert status == 'run'
+    board.put_failure(task_id, lease, 'error')
+    assert board.get_task()[0] == 'done'
+    assert board.results() == ([], [({'seed': 1}, 'error')])
+
+
+def test_expired_lease_requeued(lease_timeout = 10.0):
+    """
+    Test that a task that is not given back in time is put back in the queue 
+    with a new lease, and that only its first result is kept.
+
+    """
+    
+    now = [0.0]
+    board = di.TaskBoard([{'seed': 1}], lease_timeout = lease_timeout, clock = lambda: now[0])
+    status, task_id, task, lease = board.get_task()
+    now[0] += lease_timeout
+    status, task_id, task, new_lease = board.get_task()
+    assert status == 'run' and new_lease != lease
+    board.put_result(task_id, lease, {'energy': 1.0})
+    board.put_result(task_id, new_lease, {'energy': 2.0})
+    assert board.finished()
+    assert board.results() == ([({'seed': 1}, {'energy': 1.0})], [])
+
+
+def test_heartbeat_renews_lease(lease_timeout = 10.0):
+    """
+    Test that a task whose lease is renewed by heartbeats is not put back in the 
+    queue, and that it is once the heartbeats stop.
+
+    """
+    
+    now = [0.0]
+    board = di.TaskBoard([{'seed': 1}], lease_timeout = lease_timeout, clock = lambda: now[0])
+    status, task_id, task, lease = board.get_task()
+    for i in range(4):
+        now[0] += 0.9*lease_timeout
+        assert board.heartbeat(task_id, lease)
+        assert board.get_task()[0] == 'wait'
+    now[0] += lease_timeout
+    status, task_id, task, new_lease = board.get_task()
+    assert status == 'run'
+    assert not board.heartbeat(task_id, lease)
+    assert board.heartbeat(task_id, new_lease)
+    board.put_result(task_id, new_lease, {'energy': 1.0})
+    assert not board.heartbeat(task_id, new_lease)
+
+
+def test_stale_lease_failure_ignored(lease_timeout = 10.0, max_retries = 1):
+    """
+    Test that the failure of a worker whose lease expired neither gives up nor 
+    puts back in the queue the task, that another worker is running.
+
+    """
+    
+    now = [0.0]
+    board = di.TaskBoard([{'seed': 1}], max_retries, lease_timeout, clock = lambda: now[0])
+    status, task_id, task, stale_lease = board.get_task()
+    now[0] += lease_timeout
+    status, task_id, task, lease = board.get_task()
+    board.put_failure(task_id, stale_lease, 'error')
+    assert board.get_task()[0] == 'wait'
+    assert board.heartbeat(task_id, lease)
+    board.put_result(task_id, lease, {'energy': 1.0})
+    assert board.results() == ([({'seed': 1}, {'energy': 1.0})], [])
+
+
+def _slow_task(log, duration, **task):
+    """
+    Log that the task is run, then wait longer than the lease.
+
+    """
+    
+    with open(log, 'a') as f:
+        f.write('run\n')
+    time.sleep(duration)
+    return {'energy': 1.0}
+
+
+def test_long_task_not_duplicated(tmp_path, lease_timeout = 2.0, duration = 3.0):
+    """
+    Test that a task lasting longer than the lease is run only once, since its 
+    worker sends heartbeats.
+
+    """
+    
+    log = str(tmp_path / 'log')
+    manager, board = di.start_coordinator([{'log': log, 'duration': duration}], ('127.0.0.1', 0), lease_timeout = lease_timeout)
+    try:
+        workers = [multiprocessing.Process(target = di.run_worker, args = (manager.address,), kwargs = {'function': _slow_task, 'poll_interval': 0.05, 'heartbeat_interval': 0.1}) for i in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+        assert board.finished()
+    finally:
+        manager.shutdown()
+    with open(log) as f:
+        assert f.read() == 'run\n'
+
+
+def test_worker_stops_coordinator_shutdown(tmp_path, duration = 1.0):
+    """
+    Test that a worker exits cleanly if the coordinator shuts down while it is 
+    running a task.
+
+    """
+    
+    manager, board = di.start_coordinator([{'log': str(tmp_path / 'log'), 'duration': duration}], ('127.0.0.1', 0))
+    worker = multiprocessing.Process(target = di.run_worker, args = (manager.address,), kwargs = {'function': _slow_task, 'poll_interval': 0.05, 'heartbeat_interval': 0.05})
+    worker.start()
+    while not os.path.exists(tmp_path / 'log'):
+        time.sleep(0.05)
+    manager.shutdown()
+    worker.join(30)
+    assert worker.exitcode == 0
+
+
+def _crash_once(marker, **task):
+    """
+    Run a temperature point, but kill the process the first time.
+
+    """
+    
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return sim.run_temperature_point(**task)
+
+
+def test_dead_worker_task_requeued(tmp_path, N = 2, M = 3, T = 2.0, seed = 1):
+    """
+    Test that the task of a worker process that dies is run by another worker.
+
+    """
+    
+    task = {'N': N, 'M': M, 'T': T, 'seed': seed, 'eq_steps': 1, 'mc_steps': 2}
+    manager, board = di.start_coordinator([dict(task, marker = str(tmp_path / 'marker'))], ('127.0.0.1', 0), lease_timeout = 0.5)
+    try:
+        for i in range(2):
+            worker = multiprocessing.Process(target = di.run_worker, args = (manager.address,), kwargs = {'function': _crash_once, 'poll_interval': 0.05})
+            worker.start()
+            worker.join(30)
+        assert board.finished()
+        results, errors = board.results()
+    finally:
+        manager.shutdown()
+    assert worker.exitcode == 0
+    assert results[0][1] == sim.run_temperature_point(**task)
+
+
+#Test the lattice split into strips updated in parallel
+def test_checkerboard_raises_error_odd(N = 3, M = 4, beta = 1.0):
+    """
+    Test that an error is raised if the checkerboard update is used on a 
+    lattice with an odd dimension.
+
+    """
+    
+    lattice = fi.initialize_state(N, M)
+    with pytest.raises(ValueError):
+        lattice = fi.checkerboard_move(lattice, beta)
+
+
+def test_single_strip_equal_to_serial(N = 8, M = 6, seed = 3, beta = 0.4, sweeps = 5):
+    """
+    Test that the shared lattice updated by a single worker evolves as the 
+    serial checkerboard update with the same random numbers.
+
+    """
+    
+    lattice = fi.initialize_state(N, M, seed = seed)
+    parallel_lattice = sl.parallel_checkerboard(lattice, beta, sweeps, workers = 1, seed = seed)
+    rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+    for i in range(sweeps):
+        lattice = fi.checkerboard_move(lattice, beta, rng)
+    assert np.array_equal(parallel_lattice, lattice)
+
+
+def test_strips_low_T(N = 8, M = 6, spin_up_pol = 1, beta = np.inf):
+    """
+    Test that at zero temperature a fully polarized lattice split into strips 
+    does not change.
+
+    """
+    
+    lattice = fi.initialize_state(N, M, spin_up_pol)
+    assert np.array_equal(sl.parallel_checkerboard(lattice, beta, 3, workers = 3), lattice)
+
+
+def test_strips_equilibrium(N = 16, M = 16, T = 3.0, sweeps = 300):
+    """
+    Test that the mean energy of the lattice split into strips is compatible 
+    with the one of the serial update.
+
+    """
+    
+    lattice = fi.initialize_state(N, M)
+    serial_energy = 0.0
+    for i in range(sweeps):
+        lattice = fi.checkerboard_move(lattice, 1.0/T)
+        serial_energy += fi.calculate_energy(lattice)/(sweeps*N*M)
+    
+    parallel_energy = 0.0
+    with sl.SharedLattice(fi.initialize_state(N, M), 1.0/T, workers = 4) as shared:
+        for i in range(sweeps):
+            parallel_energy += fi.calculate_energy(shared.sweep())/(sweeps*N*M)
+    
+    assert abs(serial_energy - parallel_energy) < 0.05
+
+
+def test_strips_stopped_worker(N = 16, M = 16, T = 3.0):
+    """
+    Test that the shared lattice does not hang when a worker is killed, but
+    raises and frees the shared memory.
+
+    """
+    
+    shared = sl.SharedLattice(fi.initialize_state(N, M), 1.0/T, workers = 2)
+    shared.sweep()
+    shared._workers[0].kill()
+    shared._workers[0].join()
+    with pytest.raises(RuntimeError):
+        shared.sweep()
+    assert all(not worker.is_alive() for worker in shared._workers)
+    with pytest.raises(RuntimeError):
+        shared.sweep()
+    shared.close()
+
+
+def test_shared_engine_low_T(N = 8, M = 6, spin_up_pol = 1, T = 0.01, eq_steps = 3, mc_steps = 4):
+    """
+    Test that at zero temperature a fully polarized lattice updated by the 
+    shared engine keeps the energy and magnetization of the ground state, at 
+    every step.
+
+    """
+    
+    point = sim.run_temperature_point(N, M, T, spin_up_pol = spin_up_pol, eq_steps = eq_steps, mc_steps = mc_steps, record_steps = True, engine = 'shared', workers = 2)
+    assert point['energy'] == -2 and point['magnetization'] == 1
+    assert point['ene_steps'] == [-2*N*M]*(eq_steps + mc_steps)
+
+
+def test_shared_engine_configuration(workers = 2):
+    """
+    Test that the number of workers of the shared engine is read from the 
+    SETTINGS section, and is None if it is not given.
+
+    """
+    
+    configuration = fi.read_configuration(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CONFIGURATION.ini'))
+    assert sim.Simulation.from_configuration(configuration).workers is None
+    configuration.set('SETTINGS', 'workers', str(workers))
+    assert sim.Simulation.from_configuration(configuration).workers == workers
+    configuration.remove_option('SETTINGS', 'workers')
+    assert sim.Simulation.from_configuration(configuration).workers is None
+
+
+def test_campaign_raises_error_shared(tasks = ((8, 8, 2.0, 1),)):
+    """
+    Test that an error is raised if the campaign pool is asked to run the 
+    shared engine, whose workers it cannot start.
+
+    """
+    
+    with pytest.raises(ValueError):
+        store = ca.run_campaign(tasks, eq_steps = 1, mc_steps = 1, processes = 1, engine = 'shared')
+
+#Test the rejection-free n-fold way engine
+def test_nfold_low_T(N = 4, M = 5, spin_up_pol = 1, beta = np.inf, time = 10):
+    """
+    Test that at zero temperature a fully polarized lattice does not change,
+    while time still advances.
+
+    """
+    
+    lattice = fi.initialize_state(N, M, spin_up_pol)
+    engine = nw.NFoldWay(lattice, beta)
+    engine.run(time)
+    assert engine.total_rate() == 0
+    assert engine.time == time
+    assert np.all(lattice == 1)
+
+
+def test_nfold_buckets_consistent(N = 6, M = 5, seed = 2, beta = 0.5, time = 5):
+    """
+    Test that after the incremental updates every spin is in the bucket given 
+    by its value and its nearest neighbours, and the lattice is updated in place.
+
+    """
+    
+    lattice = fi.initialize_state(N, M, seed = seed)
+    engine = nw.NFoldWay(lattice, beta)
+    engine.run(time)
+    assert np.array_equal(np.ravel(lattice), engine._spins)
+    for site in range(N*M):
+        assert site in engine._buckets[engine._bucket_of(site)]
+    assert sum(len(members) for members in engine._buckets) == N*M
+
+
+def test_nfold_equilibrium(N = 8, M = 8, T = 2.0, seed = 1, eq_steps = 300, mc_steps = 2000):
+    """
+    Test that the mean energy of the n-fold way engine is compatible with the
+    one of the checkerboard update.
+
+    """
+    
+    nfold = sim.run_temperature_point(N, M, T, seed, 1, eq_steps, mc_steps, engine = 'nfold')
+    checkerboard = sim.run_temperature_point(N, M, T, seed, 1, eq_steps, mc_steps, engine = 'checkerboard')
+    assert abs(nfold['energy'] - checkerboard['energy']) < 0.05
+
+
+def test_raises_error_engine(N = 2, M = 2, T = 1.0):
+    """
+    Test that an error is raised if the engine is unknown.
+
+    """
+    
+    with pytest.raises(ValueError):
+        point = sim.run_temperature_point(N, M, T, engine = 'wolff')
+
+
+#Test the exact transfer matrix engine
+@pytest.mark.parametrize('N, M', [(1, 1), (2, 3), (3, 2), (3, 3), (1, 4)])
+def test_exact_enumeration(N, M, T = (0.5, 2.27, 5.0)):
+    """
+    Test that the exact averages are the same as the ones of the enumeration 
+    of all the lattice configurations, with energies given by calculate_energy.
+
+    """
+    
+    energies = []
+    magnetizations = []
+    for spins in itertools.product([-1., 1.], repeat = N*M):
+        lattice = np.reshape(spins, (N, M))
+        energies.append(fi.calculate_energy(lattice))
+        magnetizations.append(fi.calculate_magnetization(lattice))
+    energies = np.array(energies)
+    magnetizations = np.array(magnetizations)
+    
+    exact = tm.exact_observables(N, M, T)
+    for n_temp, temperature in enumerate(T):
+        weights = np.exp(-(energies - energies.min())/temperature)
+        weights /= np.sum(weights)
+        energy = np.sum(weights*energies)
+        assert np.isclose(exact['energy'][n_temp], energy/(N*M))
+        assert np.isclose(exact['specific_heat'][n_temp], (np.sum(weights*energies**2) - energy**2)/(temperature**2*N*M))
+        assert np.isclose(exact['magnetization2'][n_temp], np.sum(weights*magnetizations**2)/(N*M)**2)
+
+
+def test_exact_sweep_equal_to_points(N = 3, M = 4, T = (1.0, 2.0, 3.0)):
+    """
+    Test that the exact sweep, calculated in a single call, is the same as the 
+    single temperature points.
+
+    """
+    
+    results = sim.run_sweep(N, M, T, nT_show = 0, engine = 'exact')
+    assert len(results['ene_steps']) == 0
+    for n_temp, temperature in enumerate(T):
+        point = sim.run_temperature_point(N, M, temperature, engine = 'exact')
+        assert np.isclose(results['energy'][n_temp], point['energy'])
+        assert np.isclose(results['magnetization_rms'][n_temp], point['magnetization_rms'])
+        assert np.isclose(results['specific_heat'][n_temp], point['specific_heat'])
+
+
+def test_exact_magnetization_rms_in_store(N = 2, M = 3, T = 2.0, seed = 1):
+    """
+    Test that the exact engine gives the root mean square magnetization under its 
+    own key, and that the campaign store keeps it apart from the mean one of the 
+    Monte Carlo engines.
+
+    """
+    
+    exact = sim.run_temperature_point(N, M, T, engine = 'exact')
+    assert 'magnetization' not in exact
+    assert np.isclose(exact['magnetization_rms']**2, exact['magnetization2'])
+    monte_carlo = sim.run_temperature_point(N, M, T, seed, eq_steps = 1, mc_steps = 2)
+    store = ca.collect_store([((N, M, T, seed), exact), ((N, M, T, seed + 1), monte_carlo)])
+    magnetization = ca.STORE_COLUMNS.index('magnetization')
+    magnetization_rms = ca.STORE_COLUMNS.index('magnetization_rms')
+    assert np.isnan(store[0, magnetization]) and store[0, magnetization_rms] == exact['magnetization_rms']
+    assert store[1, magnetization] == monte_carlo['magnetization'] and np.isnan(store[1, magnetization_rms])
+
+
+def test_exact_raises_error_temperature(N = 2, M = 2, T = (1.0, 0.0)):
+    """
+    Test that an error is raised if a temperature is not positive.
+
+    """
+    
+    with pytest.raises(ValueError):
+        exact = tm.exact_observables(N, M, T)
+
+
+def test_exact_raises_error_width(tmp_path, N = tm.MAX_WIDTH + 1, M = 64, T = (1.0, 2.0)):
+    """
+    Test that an error is raised before anything is allocated if both lattice 
+    dimensions are too large for the transfer matrix, by every entry point of 
+    the exact engine.
+
+    """
+    
+    with pytest.raises(ValueError):
+        exact = tm.exact_observables(N, M, T)
+    with pytest.raises(ValueError):
+        point = sim.run_temperature_point(N, M, T[0], engine = 'exact')
+    with pytest.raises(ValueError):
+        results = sim.run_sweep(N, M, T, engine = 'exact')
+    with pytest.raises(ValueError):
+        store = di.run_distributed([(N, M, T[0], 1)], address = ('127.0.0.1', 0), engine = 'exact')
+    
+    campaign = {'sizes': '{0}'.format(N), 'T_init': '1.0', 'T_final': '2.0', 'numb_T': '2',
+                'seeds': '1', 'spin_up_pol': 'None', 'eq_steps': '10', 'mc_steps': '10',
+                'processes': '1', 'store_path': 'store.npy', 'engine': 'exact'}
+    configuration = configparser.ConfigParser()
+    configuration.read_dict({'CAMPAIGN': campaign})
+    with pytest.raises(ValueError):
+        parameters = ca.read_campaign(configuration)
+    configuration.set('CAMPAIGN', 'sizes', '{0}'.format(tm.MAX_WIDTH))
+    assert ca.read_campaign(configuration)['sizes'] == [tm.MAX_WIDTH]
+
+#Test the precomputed neighbour tables of the lattice topologies
+@pytest.mark.parametrize('kind, periodic', list(itertools.product(lt.KINDS, (True, False))))
+def test_neighbours_symmetric(kind, periodic, N = 4, M = 6):
+    """
+    Test that every site is a neighbour of its neighbours, and that the sites 
+    have the number of neighbours of the geometry, apart from the boundaries 
+    when they are open.
+
+    """
+    
+    topology = lt.LatticeTopology(N, M, kind, periodic)
+    for site, neighbours in enumerate(topology.neighbour_lists):
+        for neighbour in neighbours:
+            assert site in topology.neighbour_lists[neighbour]
+    counts = [len(neighbours) for neighbours in topology.neighbour_lists]
+    assert max(counts) == topology.coordination
+    assert (min(counts) == topology.coordination) == periodic
+
+
+@pytest.mark.parametrize('kind, periodic, bonds', [('square', True, 2*4*6), ('square', False, 2*4*6 - 4 - 6), 
+                                                   ('triangular', True, 3*4*6), ('honeycomb', True, 3*4*6//2)])
+def test_energy_polarized_topology(kind, periodic, bonds, N = 4, M = 6):
+    """
+    Test that the energy of a fully polarized lattice is minus its number of bonds.
+
+    """
+    
+    lattice = np.ones((N, M))
+    assert fi.calculate_energy(lattice, lt.get_topology(N, M, kind, periodic)) == -bonds
+
+
+def test_energy_topology_equal_to_loop(N = 5, M = 2, seed = 7):
+    """
+    Test that the energy gathered from the neighbour table is the same as the 
+    sum over the sites with PBC, also when neighbours are repeated.
+
+    """
+    
+    lattice = fi.initialize_state(N, M, seed = seed)
+    energy = 0.0
+    for x in range(N):
+        for y in range(M):
+            energy += -lattice[x, y]*(lattice[(x+1)%N, y] + lattice[x, (y+1)%M] + lattice[(x-1)%N, y] + lattice[x, (y-1)%M])/2
+    assert fi.calculate_energy(lattice) == energy
+
+
+@pytest.mark.parametrize('kind, periodic', list(itertools.product(lt.KINDS, (True, False))))
+def test_strip_neighbour_sum_equal_to_table(kind, periodic, N = 6, M = 4, rows = (2, 5), seed = 3):
+    """
+    Test that the neighbour sums of a strip of rows are the ones of the whole 
+    neighbour table, also for the square lattice with PBC, that does not use it.
+
+    """
+    
+    lattice = fi.initialize_state(N, M, seed = seed)
+    topology = lt.LatticeTopology(N, M, kind, periodic)
+    spins = np.append(lattice.ravel(), 0)
+    expected = np.sum(spins[topology.neighbours], axis = 1).reshape(N, M)[rows[0]:rows[1]]
+    assert np.array_equal(topology.neighbour_sum(lattice, rows), expected)
+
+
+def test_topology_pickled_without_tables(N = 4, M = 6):
+    """
+    Test that the square lattice with PBC calculates neighbour sums without 
+    building the neighbour table, and that built tables are not pickled.
 
+    """
+    
+    topology = lt.LatticeTopology(N, M)
+    energy = fi.calculate_energy(np.ones((N, M)), topology)
+    assert topology._neighbours is None
+    topology.neighbour_lists
+    copied = pickle.loads(pickle.dumps(topology))
+    assert copied._neighbours is None and copied._neighbour_lists is None
+    assert np.array_equal(copied.neighbours, topology.neighbours)
 
 
+def test_raises_error_honeycomb_odd(N = 4, M = 5):
+    """
+    Test that an error is raised if a periodic honeycomb lattice has an odd dimension.
 
+    """
+    
+    with pytest.raises(ValueError):
+        topology = lt.LatticeTopology(N, M, 'honeycomb')
 
 
+def test_checkerboard_raises_error_triangular(N = 4, M = 4, beta = 1.0):
+    """
+    Test that an error is raised if the checkerboard update is used on a 
+    triangular lattice, which is not bipartite.
 
+    """
+    
+    lattice = fi.initialize_state(N, M)
+    with pytest.raises(ValueError):
+        lattice = fi.checkerboard_move(lattice, beta, topology = lt.get_topology(N, M, 'triangular'))
 
 
+def test_domains_open_boundaries(N = 4, M = 4):
+    """
+    Test that a lattice with two halves of opposite spins has two domains and 
+    two walls with PBC, and a single wall with open boundaries.
+
+    """
+    
+    lattice = np.ones((N, M))
+    lattice[:, M//2:] = -1
+    periodic = fi.domain_statistics(lattice)
+    open_boundaries = fi.domain_statistics(lattice, lt.get_topology(N, M, periodic = False))
+    assert periodic['numb_domains'] == open_boundaries['numb_domains'] == 2
+    assert periodic['wall_length'] == 2*N
+    assert open_boundaries['wall_length'] == N
+
+
+@pytest.mark.parametrize('kind', lt.KINDS)
+def test_nfold_low_T_topology(kind, N = 4, M = 4, spin_up_pol = 1, T = 0.01):
+    """
+    Test that at very low temperature the energy of a fully polarized lattice 
+    is minus the coordination over two per site, for every geometry.
+
+    """
+    
+    point = sim.run_temperature_point(N, M, T, spin_up_pol = spin_up_pol, eq_steps = 2, mc_steps = 3, engine = 'nfold', topology = kind)
+    assert point['energy'] == -lt.get_topology(N, M, kind).coordination/2
 
 
+#Test the animation of the lattice evolution
+def test_snapshots_round_trip(tmp_path, N = 5, M = 4, beta = 0.5, steps = 6, every = 2):
+    """
+    Test that the frames of a run saved in a snapshot store are read back with
+    their steps and spins.
+
+    """
+    
+    lattice = fi.initialize_state(N, M)
+    frames = [(step, frame.copy()) for step, frame in an.run_frames(lattice.copy(), beta, steps, every)]
+    an.save_snapshots(frames, tmp_path / 'snapshots.npy')
+    loaded = list(an.load_snapshots(tmp_path / 'snapshots.npy'))
+    assert [step for step, frame in loaded] == list(range(0, steps + 1, every))
+    for (step, frame), (loaded_step, loaded_frame) in zip(frames, loaded):
+        assert np.array_equal(frame, loaded_frame)
+
+
+def test_gif_frames_equal_to_lattice(tmp_path, N = 7, M = 6, scale = 2, numb_frames = 3):
+    """
+    Test that every frame of the GIF shows the spins of its lattice, +1 in blue 
+    and -1 in red.
+
+    """
+    
+    from PIL import Image
+    
+    lattices = [fi.initialize_state(N, M, seed = seed) for seed in range(numb_frames)]
+    assert an.render_animation(enumerate(lattices), str(tmp_path / 'evolution.gif'), scale = scale, title = False) == numb_frames
+    
+    with Image.open(tmp_path / 'evolution.gif') as animation:
+        assert animation.n_frames == numb_frames
+        for n_frame, lattice in enumerate(lattices):
+            animation.seek(n_frame)
+            pixels = np.asarray(animation.convert('RGB'))[:N*scale:scale, :M*scale:scale]
+            assert np.array_equal(pixels[:, :, 2] > pixels[:, :, 0], lattice > 0)
+
+
+def test_gif_polarized_first_frame(tmp_path, N = 8, M = 8, spin_up_pol = 1, scale = 2):
+    """
+    Test that the spins of a frame are shown in their colors also when the
+    first frame is fully polarized, without the color of the other spins.
+
+    """
+    
+    from PIL import Image
+    
+    lattices = [fi.initialize_state(N, M, spin_up_pol), fi.initialize_state(N, M)]
+    an.render_animation(enumerate(lattices), str(tmp_path / 'evolution.gif'), scale = scale, title = False)
+    
+    with Image.open(tmp_path / 'evolution.gif') as animation:
+        animation.seek(1)
+        pixels = np.asarray(animation.convert('RGB'))[:N*scale:scale, :M*scale:scale]
+        assert np.array_equal(pixels[:, :, 2] > pixels[:, :, 0], lattices[1] > 0)
+
+def test_animation_raises_error_no_frames(tmp_path):
+    """
+    Test that an error is raised if there are no frames to render.
+
+    """
+    
+    with pytest.raises(ValueError):
+        numb_frames = an.render_animation([], str(tmp_path / 'evolution.gif'))
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 18:52:23 2026
+"""
+
+
+import numpy as np
+
+
+#Maximum memory, in bytes, of the transfer matrices diagonalized at once
+CHUNK_BYTES = 2**28
+
+#Maximum length of the rows: the transfer matrix has 2**MAX_WIDTH rows, and each of the
+#arrays of its diagonalization takes 128 MiB
+MAX_WIDTH = 12
+
+
+def check_width(N, M):
+    """
+    This function checks that the shorter dimension of a lattice is small
+    enough for its transfer matrix, before anything is allocated
+
+    Parameters
+    ----------
+    N : int
+        length of the lattice.
+    M : int
+        width of the lattice.
+
+    Returns
+    -------
+        None.
+
+    Raises
+    ------
+        ValueError if both lattice dimensions are > MAX_WIDTH.
+
+    """
+
+    if min(N, M) > MAX_WIDTH:
+        raise ValueError('The exact engine needs a lattice dimension <= {0}, since the transfer matrix has 2**min(N, M) rows, but the dimensions are {1} and {2}\n'.format(MAX_WIDTH, N, M))
+
+
+def row_states(width):
+    """
+    This function lists all the spin configurations of a lattice row
+
+    Parameters
+    ----------
+    width : int
+        number of spins in the row.
+
+    Returns
+    -------
+        2**width x width array of spins, +1 or -1.
+
+    """
+
+    bits = (np.arange(2**width)[:, None] >> np.arange(width)) & 1
+
+    return 1.0 - 2.0*bits
+
+
+def pair_energies(width):
+    """
+    This function calculates the energy shared by two consecutive rows, with
+    the same PBC convention of calculate_energy: each row has half of its own
+    energy on each side, plus the coupling between the two rows
+
+    Parameters
+    ----------
+    width : int
+        number of spins in the rows.
+
+    Returns
+    -------
+        2**width x 2**width array of energies, the rows being in the order of row_states.
+
+    """
+
+    states = row_states(width)
+
+    #Energy inside a row, each bond to the next spin counted once, considering PBC
+    row_energy = -np.sum(states*np.roll(states, -1, axis = 1), axis = 1)
+
+    return row_energy[:, None]/2 + row_energy[None, :]/2 - states @ states.T
+
+
+def exact_observables(N, M, T):
+    """
+    This function calculates exactly the thermodinamical averages of the
+    N*M lattice with PBC, for all temperatures at once, from the eigenvalues
+    and eigenvectors of the row transfer matrix; rows are taken along the
+    shorter dimension, whose length sets the 2**min(N, M) size of the matrix,
+    so one dimension must be up to MAX_WIDTH
+
+    Parameters
+    ----------
+    N : int
+        length of the lattice.
+    M : int
+        width of the lattice.
+    T : 1D-like array
+        temperature points, with the Boltzmann constant k taken equal to 1.
+
+    Returns
+    -------
+        dictionary of arrays with the temperature points 'T', and for each of them
+        the intensive mean 'energy', the 'specific_heat' per site, the mean
+        squared magnetization per site 'magnetization2' = <M^2>/(N*M)^2 (the mean
+        magnetization is zero by symmetry) and the 'susceptibility' per site.
+
+    Raises
+    ------
+        ValueError if lattice dimensions are < 1 or both > MAX_WIDTH, or if any
+        temperature is not positive.
+
+    """
+
+    if N < 1 or M < 1:
+        raise ValueError('Both lattice dimensions must be >= 1, but are {0} and {1}\n'.format(N, M))
+    check_width(N, M)
+
+    T = np.atleast_1d(np.asarray(T, dtype = float))
+    if np.any(T <= 0):
+        raise ValueError('Temperatures must be positive, but got {0}\n'.format(T[T <= 0]))
+
+    #The energy does not change exchanging length and width
+    width, length = min(N, M), max(N, M)
+    sites = N*M
+
+    pair_energy = pair_energies(width)
+    row_mag = np.sum(row_states(width), axis = 1)
+    beta = 1.0/T
+
+    energy = np.zeros(len(T))
+    energy2 = np.zeros(len(T))
+    magnetization2 = np.zeros(len(T))
+
+    #Temperatures are diagonalized in chunks, so that memory stays bounded
+    chunk = max(1, CHUNK_BYTES//(8*pair_energy.size*4))
+    for first in range(0, len(T), chunk):
+        b = beta[first:first + chunk, None, None]
+
+        #Transfer matrix divided by its largest element, which leaves averages unchanged
+        exponent = -b*pair_energy
+        transfer = np.exp(exponent - np.max(exponent, axis = (1, 2), keepdims = True))
+        eigenvalues, eigenvectors = np.linalg.eigh(transfer)
+
+        #Eigenvalues divided by the largest one, which is positive since all matrix elements are
+        largest = eigenvalues[:, -1:]
+        mu = eigenvalues/largest
+
+        #Derivatives of the transfer matrix with respect to beta and row magnetization, in the
+        #eigenvector basis; only the diagonal of the second derivative is needed
+        transposed = np.swapaxes(eigenvectors, 1, 2)
+        first_derivative = transposed @ (-transfer*pair_energy) @ eigenvectors/largest[:, :, None]
+        second_derivative = np.sum(eigenvectors*((transfer*pair_energy**2) @ eigenvectors), axis = 1)/largest
+        row_mag_rotated = transposed @ (row_mag[None, :, None]*eigenvectors)
+
+        #Powers mu**r for r = 0, ..., length
+        powers = mu[:, None, :]**np.arange(length + 1)[None, :, None]
+
+        Z = np.sum(powers[:, length], axis = 1)
+
+        #First derivative of Z: length*Tr(T' T^(length-1))
+        dZ = length*np.sum(np.diagonal(first_derivative, axis1 = 1, axis2 = 2)*powers[:, length - 1], axis = 1)
+        first_derivative2 = first_derivative**2
+        row_mag_rotated2 = row_mag_rotated**2
+
+        #Second derivative of Z: length*Tr(T'' T^(length-1)) + length*sum_r Tr(T' T^r T' T^(length-2-r))
+        d2Z = length*np.sum(second_derivative*powers[:, length - 1], axis = 1)
+        for r in range(length - 1):
+            d2Z += length*(powers[:, length - 2 - r, None, :] @ first_derivative2 @ powers[:, r, :, None])[:, 0, 0]
+
+        #Squared magnetization: length*sum_r <m_0 m_r>, with m the magnetization of a row
+        M2 = np.zeros(len(Z))
+        for r in range(length):
+            M2 += length*(powers[:, length - r, None, :] @ row_mag_rotated2 @ powers[:, r, :, None])[:, 0, 0]
+
+        energy[first:first + chunk] = -dZ/Z
+        energy2[first:first + chunk] = d2Z/Z
+        magnetization2[first:first + chunk] = M2/Z
+
+    return {'T': T,
+            'energy': energy/sites,
+            'specific_heat': beta**2*(energy2 - energy**2)/sites,
+            'magnetization2': magnetization2/sites**2,
+            'susceptibility': beta*magnetization2/sites}